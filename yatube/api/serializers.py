@@ -0,0 +1,84 @@
+"""Сериализация ответов API без моделей и форм.
+
+Ресурс — словарь «поле ответа → путь для QuerySet.values()». Строки
+читаются из базы сразу словарями, связанные объекты приходят тем же
+запросом через JOIN, экземпляры моделей не создаются. Клиент может
+запросить только нужные поля (?fields=id,text); ключ пагинации
+читается всегда.
+"""
+from posts.models import Post
+
+POST = {
+    'id': 'id',
+    'text': 'text',
+    'created': 'created',
+    'updated': 'updated',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+}
+# Число комментариев меняет только версию поста, а не ленты, поэтому
+# оно есть лишь в ответе об одном посте.
+POST_DETAIL = {
+    **POST,
+    'comments_count': 'comments_count',
+}
+GROUP = {
+    'id': 'id',
+    'slug': 'slug',
+    'title': 'title',
+    'description': 'description',
+}
+COMMENT = {
+    'id': 'id',
+    'post': 'post_id',
+    'parent': 'parent_id',
+    'depth': 'depth',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+    'replies_count': 'replies_count',
+}
+FOLLOW = {
+    'id': 'id',
+    'user': 'user__username',
+    'author': 'author__username',
+}
+
+
+def image_url(name):
+    return Post.image.field.storage.url(name) if name else None
+
+
+CONVERTERS = {
+    'image': image_url,
+}
+
+
+def parse_fields(value, resource):
+    """Запрошенные поля ресурса; ValueError для неизвестных."""
+    if not value:
+        return list(resource)
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = set(names) - set(resource)
+    if unknown:
+        raise ValueError(
+            f'Неизвестные поля: {", ".join(sorted(unknown))}'
+        )
+    return names
+
+
+def read(queryset, resource, names, key=()):
+    """Словари с полями names; поля key читаются, но не отдаются."""
+    paths = {resource.get(name, name) for name in (*names, *key)}
+    rows = list(queryset.values(*paths))
+    return rows, [serialize(row, resource, names) for row in rows]
+
+
+def serialize(row, resource, names):
+    result = {}
+    for name in names:
+        value = row[resource[name]]
+        convert = CONVERTERS.get(name)
+        result[name] = convert(value) if convert else value
+    return result
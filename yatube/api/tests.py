@@ -0,0 +1,121 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='api_author')
+        cls.reader = User.objects.create_user(username='api_reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='api-group', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.author, group=cls.group
+            )
+            for i in range(5)
+        ]
+        cls.comment = Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_posts_keyset_pages(self):
+        """Посты отдаются порциями по курсору, без повторов."""
+        url = reverse('api:posts')
+        first = self.client.get(url, {'limit': 3}).json()
+        self.assertEqual(
+            [post['text'] for post in first['results']],
+            ['Пост 4', 'Пост 3', 'Пост 2']
+        )
+        second = self.client.get(first['next']).json()
+        self.assertEqual(
+            [post['text'] for post in second['results']],
+            ['Пост 1', 'Пост 0']
+        )
+        self.assertIsNone(second['next'])
+
+    def test_sparse_fields_and_relations(self):
+        """Поля выбираются параметром fields, связи — одним запросом."""
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse('api:posts'), {'fields': 'id,author,group'}
+            )
+        self.assertEqual(response.json()['results'][0], {
+            'id': self.posts[4].id,
+            'author': 'api_author',
+            'group': 'api-group',
+        })
+        response = self.client.get(reverse('api:posts'), {'fields': 'secret'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_etag_not_modified(self):
+        """Повтор запроса с ETag получает 304, пока данные не менялись."""
+        url = reverse('api:post', kwargs={'post_id': self.posts[0].id})
+        response = self.client.get(url)
+        self.assertEqual(response.json()['comments_count'], 1)
+        etag = response['ETag']
+        # ETag поста зависит ещё от его автора и группы: их слаг и имя
+        # читаются одним запросом по первичному ключу.
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Comment.objects.create(
+            post=self.posts[0], author=self.reader, text='Новый'
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['comments_count'], 2)
+
+    def test_etag_follows_group_changes(self):
+        """ETag поста меняется при переименовании и удалении его группы."""
+        url = reverse('api:post', kwargs={'post_id': self.posts[0].id})
+        etag = self.client.get(url)['ETag']
+        self.group.slug = 'renamed-group'
+        self.group.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['group'], 'renamed-group')
+        etag = response['ETag']
+        self.group.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.json()['group'])
+
+    def test_comments_groups_and_follows(self):
+        """Комментарии, группы и подписки читателя."""
+        response = self.client.get(reverse(
+            'api:comments', kwargs={'post_id': self.posts[0].id}
+        ))
+        self.assertEqual(response.json()['results'][0]['author'], 'api_reader')
+        response = self.client.get(
+            reverse('api:group', kwargs={'slug': 'api-group'})
+        )
+        self.assertEqual(response.json()['title'], 'Группа')
+        self.assertEqual(self.client.get(reverse('api:follows')).status_code,
+                         401)
+        self.client.force_login(self.reader)
+        response = self.client.get(reverse('api:follows'))
+        self.assertEqual(
+            response.json()['results'],
+            [{'id': Follow.objects.get().id, 'user': 'api_reader',
+              'author': 'api_author'}]
+        )
+
+    def test_missing_post(self):
+        """Несуществующий пост — JSON с кодом 404."""
+        response = self.client.get(
+            reverse('api:post', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('error', response.json())
@@ -0,0 +1,167 @@
+"""JSON API v1 для мобильных клиентов.
+
+Списки отдаются порциями по ключу (курсор в next), поля выбираются
+параметром fields, ETag строится по версиям лент (posts.cache), поэтому
+повторный запрос с If-None-Match получает 304 без выборки данных.
+"""
+from functools import wraps
+
+from django.db.models import Q
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import condition, require_GET
+
+from posts.cache import (INDEX, follow_scope, group_scope, post_page_scopes,
+                         post_scope, version_etag)
+from posts.models import Comment, Follow, Group, Post
+from posts.utils import COUNT_POST, decode_key, encode_key
+
+from .serializers import (COMMENT, FOLLOW, GROUP, POST, POST_DETAIL,
+                          parse_fields, read)
+
+MAX_LIMIT: int = 100
+
+
+def respond(data, status=200):
+    return JsonResponse(
+        data, status=status, json_dumps_params={'ensure_ascii': False}
+    )
+
+
+def api_view(view_func):
+    """Только GET; ошибки запроса — JSON с кодом 400 или 404."""
+    @require_GET
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view_func(request, *args, **kwargs)
+        except ValueError as error:
+            return respond({'error': str(error)}, status=400)
+        except Http404:
+            return respond({'error': 'Не найдено'}, status=404)
+    return wrapper
+
+
+def login_required(view_func):
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return respond({'error': 'Нужна авторизация'}, status=401)
+        return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+def number(value, name):
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'{name} должен быть числом')
+
+
+def page_size(request):
+    size = number(request.GET.get('limit', COUNT_POST), 'limit')
+    return min(max(size, 1), MAX_LIMIT)
+
+
+def next_url(request, cursor):
+    query = request.GET.copy()
+    query['cursor'] = cursor
+    return f'{request.path}?{query.urlencode()}'
+
+
+def newest_first(request, queryset, resource):
+    """Порция от новых к старым по ключу (created, id)."""
+    names = parse_fields(request.GET.get('fields'), resource)
+    size = page_size(request)
+    queryset = queryset.order_by('-created', '-id')
+    if request.GET.get('cursor'):
+        created, pk = decode_key(request.GET['cursor'])
+        queryset = queryset.filter(
+            Q(created__lt=created) | Q(created=created, pk__lt=pk)
+        )
+    rows, results = read(
+        queryset[:size + 1], resource, names, key=('created', 'id')
+    )
+    cursor = None
+    if len(rows) > size:
+        cursor = encode_key(rows[size - 1]['created'], rows[size - 1]['id'])
+    return page_response(request, results[:size], cursor)
+
+
+def by_id(request, queryset, resource):
+    """Порция по возрастанию id."""
+    names = parse_fields(request.GET.get('fields'), resource)
+    size = page_size(request)
+    queryset = queryset.order_by('id')
+    if request.GET.get('cursor'):
+        cursor = number(request.GET['cursor'], 'cursor')
+        queryset = queryset.filter(pk__gt=cursor)
+    rows, results = read(queryset[:size + 1], resource, names, key=('id',))
+    cursor = str(rows[size - 1]['id']) if len(rows) > size else None
+    return page_response(request, results[:size], cursor)
+
+
+def page_response(request, results, cursor):
+    return respond({
+        'results': results,
+        'next': cursor and next_url(request, cursor),
+    })
+
+
+def single(request, queryset, resource):
+    names = parse_fields(request.GET.get('fields'), resource)
+    _, results = read(queryset[:1], resource, names)
+    if not results:
+        raise Http404
+    return respond(results[0])
+
+
+@api_view
+@condition(etag_func=version_etag(INDEX))
+def posts(request):
+    queryset = Post.objects.all()
+    if 'group' in request.GET:
+        queryset = queryset.filter(group__slug=request.GET['group'])
+    if 'author' in request.GET:
+        queryset = queryset.filter(author__username=request.GET['author'])
+    return newest_first(request, queryset, POST)
+
+
+@api_view
+@condition(etag_func=version_etag(post_page_scopes))
+def post(request, post_id):
+    return single(request, Post.objects.filter(pk=post_id), POST_DETAIL)
+
+
+@api_view
+@condition(etag_func=version_etag(post_scope('{post_id}')))
+def comments(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    queryset = Comment.objects.filter(post_id=post_id)
+    parent = request.GET.get('parent')
+    if parent == 'root':
+        queryset = queryset.filter(depth=0)
+    elif parent:
+        queryset = queryset.filter(parent_id=number(parent, 'parent'))
+    return newest_first(request, queryset, COMMENT)
+
+
+@api_view
+@condition(etag_func=version_etag(INDEX))
+def groups(request):
+    return by_id(request, Group.objects.all(), GROUP)
+
+
+@api_view
+@condition(etag_func=version_etag(group_scope('{slug}')))
+def group(request, slug):
+    return single(request, Group.objects.filter(slug=slug), GROUP)
+
+
+@api_view
+@login_required
+@condition(etag_func=version_etag(
+    lambda request: [follow_scope(request.user.pk)]
+))
+def follows(request):
+    return by_id(request, Follow.objects.filter(user=request.user), FOLLOW)
@@ -0,0 +1,226 @@
+"""Кэш, общий для всех процессов одного хоста.
+
+Записи лежат в SQLite-файле (по умолчанию в /dev/shm, то есть в
+разделяемой памяти), который каждый процесс отображает в память через
+mmap. Файл открыт в режиме WAL, поэтому читатели не ждут писателей.
+При переполнении вытесняются записи, к которым дольше всего не
+обращались (LRU).
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+DEFAULT_LOCATION = '/dev/shm/yatube_cache.sqlite3'
+MMAP_SIZE: int = 256 * 1024 * 1024
+BUSY_TIMEOUT: float = 5.0
+# Время последнего обращения обновляется не чаще раза в секунду,
+# чтобы чтение не превращалось в запись на каждый hit.
+ACCESS_RESOLUTION: float = 1.0
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+'''
+
+
+class SharedMemoryCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._location = location or DEFAULT_LOCATION
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        # Соединение своё у каждого потока и у каждого процесса после fork.
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            db = sqlite3.connect(
+                self._location,
+                timeout=BUSY_TIMEOUT,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=OFF')
+            db.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+            db.executescript(SCHEMA)
+            self._local.db, self._local.pid = db, pid
+        return self._local.db
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _expires(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    def _load(self, keys):
+        """Живые записи по ключам, попутно отмечая обращение к ним."""
+        now = time.time()
+        placeholders = ','.join('?' * len(keys))
+        rows = self._db.execute(
+            'SELECT key, value, accessed FROM cache '
+            f'WHERE key IN ({placeholders}) '
+            'AND (expires IS NULL OR expires > ?)',
+            (*keys, now)
+        ).fetchall()
+        stale = [key for key, _, accessed in rows
+                 if now - accessed > ACCESS_RESOLUTION]
+        if stale:
+            self._db.execute(
+                'UPDATE cache SET accessed = ? '
+                f'WHERE key IN ({",".join("?" * len(stale))})',
+                (now, *stale)
+            )
+        return {key: pickle.loads(value) for key, value, _ in rows}
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        return self._load([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        return {
+            keys[key]: value for key, value in self._load(list(keys)).items()
+        }
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self._db.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time())
+        ).fetchone() is not None
+
+    def _write(self, db, key, value, timeout, mode):
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        if mode == 'add':
+            cursor = db.execute(
+                'INSERT INTO cache (key, value, expires, accessed) '
+                'VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+                'value = excluded.value, expires = excluded.expires, '
+                'accessed = excluded.accessed '
+                'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+                (key, pickled, self._expires(timeout), time.time(),
+                 time.time())
+            )
+            return cursor.rowcount > 0
+        db.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires, accessed) '
+            'VALUES (?, ?, ?, ?)',
+            (key, pickled, self._expires(timeout), time.time())
+        )
+        return True
+
+    def _set_many(self, items, timeout, mode='set'):
+        db = self._db
+        with _write_transaction(db):
+            results = [
+                self._write(db, key, value, timeout, mode)
+                for key, value in items
+            ]
+            self._cull(db)
+        return results
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        return self._set_many([(key, value)], timeout, mode='add')[0]
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._set_many([(self._key(key, version), value)], timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        self._set_many(
+            [(self._key(key, version), value) for key, value in data.items()],
+            timeout
+        )
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        cursor = self._db.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self._expires(timeout), key, time.time())
+        )
+        return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        db = self._db
+        with _write_transaction(db):
+            row = db.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (key, time.time())
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            db.execute(
+                'UPDATE cache SET value = ?, accessed = ? WHERE key = ?',
+                (pickle.dumps(value, self.pickle_protocol), time.time(), key)
+            )
+        return value
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        self._db.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            placeholders = ','.join('?' * len(keys))
+            self._db.execute(
+                f'DELETE FROM cache WHERE key IN ({placeholders})', keys
+            )
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def _cull(self, db):
+        count = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count <= self._max_entries:
+            return
+        db.execute(
+            'DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?',
+            (time.time(),)
+        )
+        count = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count <= self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            db.execute('DELETE FROM cache')
+            return
+        db.execute(
+            'DELETE FROM cache WHERE key IN ('
+            'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+            (max(count // self._cull_frequency, count - self._max_entries),)
+        )
+
+
+@contextmanager
+def _write_transaction(db):
+    """BEGIN IMMEDIATE: блокировка на запись берётся сразу, без гонок."""
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        yield
+    except BaseException:
+        db.execute('ROLLBACK')
+        raise
+    db.execute('COMMIT')
@@ -0,0 +1,116 @@
+"""Число строк без полного COUNT(*).
+
+Выборки до settings.EXACT_COUNT_THRESHOLD строк считаются точно, причём
+счёт останавливается на пороге. Для выборок больше порога берётся, по
+порядку:
+
+- известное вызывающему значение (например, денормализованный счётчик
+  постов автора или группы);
+- для всей таблицы — статистика планировщика (sqlite_stat1 после
+  ANALYZE в SQLite, reltuples в PostgreSQL), а без неё — счётчик строк
+  таблицы TableRows;
+- для отфильтрованной выборки в PostgreSQL — оценка из EXPLAIN.
+
+Только если ничего из этого нет, выполняется полный COUNT(*).
+"""
+import json
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import F
+
+from .models import TableRows
+
+
+def planner_estimate(model, using='default'):
+    """Оценка числа строк таблицы по статистике планировщика или None."""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+            )
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute(
+                'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+                [table]
+            )
+            row = cursor.fetchone()
+            return row and int(row[0].split()[0])
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                [table]
+            )
+            row = cursor.fetchone()
+            return row and row[0] >= 0 and int(row[0]) or None
+    return None
+
+
+def query_estimate(queryset):
+    """Оценка числа строк выборки по плану запроса или None."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def counted_rows(model):
+    """Число строк таблицы по счётчику TableRows или None."""
+    return TableRows.objects.filter(
+        table=model._meta.db_table
+    ).values_list('rows', flat=True).first()
+
+
+def recount_rows(model):
+    TableRows.objects.update_or_create(
+        table=model._meta.db_table,
+        defaults={'rows': model._default_manager.count()}
+    )
+
+
+def change_rows(model, delta):
+    """Меняет счётчик строк таблицы в транзакции записи."""
+    updated = TableRows.objects.filter(
+        table=model._meta.db_table
+    ).update(rows=F('rows') + delta)
+    if not updated:
+        recount_rows(model)
+
+
+def table_estimate(model, using='default'):
+    estimate = planner_estimate(model, using)
+    if estimate is None:
+        estimate = counted_rows(model)
+    return estimate
+
+
+def estimated_count(queryset, known=None, threshold=None):
+    """Точное число строк до порога, дальше — оценка, если она есть.
+
+    known может быть функцией без аргументов: её вызывают, только если
+    строк больше порога.
+    """
+    if threshold is None:
+        threshold = settings.EXACT_COUNT_THRESHOLD
+    bounded = queryset.order_by()[:threshold + 1].count()
+    if bounded <= threshold:
+        return bounded
+    if callable(known):
+        known = known()
+    if known is None:
+        if queryset.query.where:
+            known = query_estimate(queryset)
+        else:
+            known = table_estimate(queryset.model, queryset.db)
+    if known is None:
+        return queryset.count()
+    return max(known, bounded)
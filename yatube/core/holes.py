@@ -0,0 +1,57 @@
+"""Дырки в закэшированных страницах.
+
+Страница, общая для всех пользователей, кэшируется с метками на месте
+персональных фрагментов (шапка, вкладки, кнопка подписки). Метки
+заменяются на фрагменты, отрисованные для текущего запроса, уже после
+чтения страницы из кэша.
+
+Аргументы фрагмента хранятся в метке как JSON (в base64, чтобы не
+ломать HTML-комментарий), поэтому числа и булевы значения доходят до
+шаблона фрагмента с прежними типами.
+"""
+import json
+import re
+
+from django.template.loader import render_to_string
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from django.utils.safestring import mark_safe
+
+HOLE = re.compile(r'<!--hole:([\w/.-]+)\?([\w-]*)-->')
+
+
+def punch(request):
+    """Дальше страница рисуется с метками вместо персональных фрагментов."""
+    request.punch_holes = True
+
+
+def is_punched(request):
+    return getattr(request, 'punch_holes', False)
+
+
+def encode_kwargs(kwargs):
+    return urlsafe_base64_encode(force_bytes(json.dumps(kwargs)))
+
+
+def decode_kwargs(encoded):
+    return json.loads(force_str(urlsafe_base64_decode(encoded)))
+
+
+def marker(template_name, **kwargs):
+    return mark_safe(
+        f'<!--hole:{template_name}?{encode_kwargs(kwargs)}-->'
+    )
+
+
+def fill(response, request):
+    """Заменяет метки в ответе фрагментами, отрисованными для request.
+
+    Ответ должен быть копией из кэша, а не самой записью в нём.
+    """
+    response.content = HOLE.sub(
+        lambda match: render_to_string(
+            match[1], decode_kwargs(match[2]), request=request
+        ),
+        response.content.decode(response.charset)
+    )
+    return response
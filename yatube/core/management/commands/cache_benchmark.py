@@ -0,0 +1,84 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache import SharedMemoryCache
+
+PAGE = b'x' * 20 * 1024
+
+
+def make_cache(backend, location):
+    if backend == 'locmem':
+        return LocMemCache(f'benchmark-{os.getpid()}', {})
+    return SharedMemoryCache(location, {})
+
+
+def serve(backend, location, keys, requests, results):
+    """Воркер: как cache_page, при промахе «рендерит» и кладёт в кэш."""
+    cache = make_cache(backend, location)
+    hits = 0
+    for i in range(requests):
+        key = f'page:{i % keys}'
+        if cache.get(key) is None:
+            cache.set(key, PAGE)
+        else:
+            hits += 1
+    results.put(hits)
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает SharedMemoryCache с LocMemCache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ops', type=int, default=20000)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--keys', type=int, default=200)
+        parser.add_argument('--requests', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            location = os.path.join(directory, 'cache.sqlite3')
+            for backend in ('locmem', 'shared'):
+                self.throughput(backend, location, options['ops'])
+            for backend in ('locmem', 'shared'):
+                make_cache(backend, location).clear()
+                self.hit_rate(backend, location, options)
+
+    def throughput(self, backend, location, ops):
+        cache = make_cache(backend, location)
+        started = time.perf_counter()
+        for i in range(ops):
+            cache.set(f'key:{i % 1000}', PAGE)
+        set_time = time.perf_counter() - started
+        started = time.perf_counter()
+        for i in range(ops):
+            cache.get(f'key:{i % 1000}')
+        get_time = time.perf_counter() - started
+        self.stdout.write(
+            f'{backend:>7}: set {ops / set_time:10.0f} оп/с, '
+            f'get {ops / get_time:10.0f} оп/с'
+        )
+
+    def hit_rate(self, backend, location, options):
+        results = multiprocessing.Queue()
+        workers = [
+            multiprocessing.Process(target=serve, args=(
+                backend, location, options['keys'], options['requests'],
+                results
+            ))
+            for _ in range(options['workers'])
+        ]
+        for worker in workers:
+            worker.start()
+        hits = sum(results.get() for _ in workers)
+        for worker in workers:
+            worker.join()
+        total = options['workers'] * options['requests']
+        self.stdout.write(
+            f'{backend:>7}: {options["workers"]} воркеров, '
+            f'попаданий в кэш {hits / total:.1%}'
+        )
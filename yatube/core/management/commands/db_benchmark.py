@@ -0,0 +1,137 @@
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.backends.sqlite3.base import apply_pragmas
+
+SCHEMA = '''
+CREATE TABLE post (
+    id INTEGER PRIMARY KEY, created REAL NOT NULL, text TEXT NOT NULL,
+    comments_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX post_created ON post (created);
+CREATE TABLE comment (
+    id INTEGER PRIMARY KEY, post_id INTEGER NOT NULL, text TEXT NOT NULL
+);
+'''
+# Стандартный бэкенд Django: журнал отката, BEGIN и таймаут 5 секунд;
+# core.backends.sqlite3: WAL, BEGIN IMMEDIATE и таймаут из настроек.
+MODES = {
+    'stock': {'tuned': False, 'begin': 'BEGIN', 'timeout': 5},
+    'tuned': {'tuned': True, 'begin': 'BEGIN IMMEDIATE', 'timeout': 20},
+}
+
+
+def connect(location, mode):
+    connection = sqlite3.connect(
+        location, timeout=MODES[mode]['timeout'], isolation_level=None
+    )
+    if MODES[mode]['tuned']:
+        apply_pragmas(connection)
+    return connection
+
+
+def read(location, mode, posts, deadline, results):
+    """Читатель: страницы ленты, как index."""
+    connection = connect(location, mode)
+    done = errors = 0
+    while time.time() < deadline:
+        try:
+            connection.execute(
+                'SELECT id, text FROM post ORDER BY created DESC '
+                'LIMIT 10 OFFSET ?', ((done * 10) % posts,)
+            ).fetchall()
+            done += 1
+        except sqlite3.OperationalError:
+            errors += 1
+    results.put(('read', done, errors))
+
+
+def write(location, mode, posts, deadline, results):
+    """Писатель: комментарий и счётчик поста в одной транзакции."""
+    connection = connect(location, mode)
+    done = errors = 0
+    while time.time() < deadline:
+        post_id = done % posts + 1
+        try:
+            connection.execute(MODES[mode]['begin'])
+            connection.execute(
+                'SELECT comments_count FROM post WHERE id = ?', (post_id,)
+            ).fetchone()
+            connection.execute(
+                'INSERT INTO comment (post_id, text) VALUES (?, ?)',
+                (post_id, 'Комментарий')
+            )
+            connection.execute(
+                'UPDATE post SET comments_count = comments_count + 1 '
+                'WHERE id = ?', (post_id,)
+            )
+            connection.execute('COMMIT')
+            done += 1
+        except sqlite3.OperationalError:
+            errors += 1
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+    results.put(('write', done, errors))
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает чтение ленты при одновременной записи в стандартном '
+        'SQLite и в core.backends.sqlite3.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--posts', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        for mode in MODES:
+            with tempfile.TemporaryDirectory() as directory:
+                location = os.path.join(directory, 'db.sqlite3')
+                self.prepare(location, mode, options['posts'])
+                self.run(location, mode, options)
+
+    def prepare(self, location, mode, posts):
+        connection = connect(location, mode)
+        connection.executescript(SCHEMA)
+        connection.execute('BEGIN')
+        connection.executemany(
+            'INSERT INTO post (created, text) VALUES (?, ?)',
+            ((i, f'Пост {i}') for i in range(posts))
+        )
+        connection.execute('COMMIT')
+        connection.close()
+
+    def run(self, location, mode, options):
+        results = multiprocessing.Queue()
+        deadline = time.time() + options['seconds']
+        workers = [
+            multiprocessing.Process(target=target, args=(
+                location, mode, options['posts'], deadline, results
+            ))
+            for target, number in ((read, options['readers']),
+                                   (write, options['writers']))
+            for _ in range(number)
+        ]
+        for worker in workers:
+            worker.start()
+        totals = {'read': [0, 0], 'write': [0, 0]}
+        for _ in workers:
+            kind, done, errors = results.get()
+            totals[kind][0] += done
+            totals[kind][1] += errors
+        for worker in workers:
+            worker.join()
+        seconds = options['seconds']
+        self.stdout.write(
+            f'{mode}: чтение {totals["read"][0] / seconds:8.0f} запр/с, '
+            f'запись {totals["write"][0] / seconds:6.0f} тр/с, '
+            f'ошибок блокировки {totals["read"][1] + totals["write"][1]}'
+        )
@@ -0,0 +1,51 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+
+def copy_database(source, target):
+    """Переносит снимок SQLite-базы source в target одним шагом."""
+    primary = sqlite3.connect(source)
+    replica = sqlite3.connect(target)
+    try:
+        primary.backup(replica)
+    finally:
+        replica.close()
+        primary.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную SQLite-базу в реплики из DATABASE_REPLICAS: '
+        'локальная замена репликации.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=settings.REPLICA_LAG / 2
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Скопировать базу один раз и завершиться.'
+        )
+
+    def handle(self, *args, **options):
+        source = settings.DATABASES[DEFAULT_DB_ALIAS]
+        targets = [
+            settings.DATABASES[alias] for alias in settings.DATABASE_REPLICAS
+        ]
+        if not targets:
+            raise CommandError('Реплики не настроены: DATABASE_REPLICAS пуст')
+        for database in (source, *targets):
+            if 'sqlite3' not in database['ENGINE']:
+                raise CommandError('Копировать можно только SQLite-базы')
+        while True:
+            for target in targets:
+                copy_database(source['NAME'], target['NAME'])
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('Реплики обновлены'))
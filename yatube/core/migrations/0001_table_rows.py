@@ -0,0 +1,21 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableRows',
+            fields=[
+                ('table', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='Таблица')),
+                ('rows', models.BigIntegerField(default=0, verbose_name='Число строк')),
+            ],
+        ),
+    ]
@@ -10,3 +10,12 @@ class CreatedModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class TableRows(models.Model):
+    """Число строк большой таблицы, обновляемое при записи (core.counts)."""
+    table = models.CharField('Таблица', max_length=100, primary_key=True)
+    rows = models.BigIntegerField('Число строк', default=0)
+
+    def __str__(self):
+        return f'{self.table}: {self.rows}'
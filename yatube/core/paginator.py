@@ -0,0 +1,21 @@
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+
+from .counts import estimated_count
+
+
+class EstimatedCountPaginator(Paginator):
+    """Паджинатор, который не делает COUNT(*) по всей большой таблице.
+
+    known_count — уже известное число строк, например денормализованный
+    счётчик, или функция, которая его возвращает; оно используется, если
+    строк больше порога точного счёта.
+    """
+
+    def __init__(self, *args, known_count=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.known_count = known_count
+
+    @cached_property
+    def count(self):
+        return estimated_count(self.object_list, known=self.known_count)
@@ -0,0 +1,88 @@
+"""Чтение с реплик, запись в основную базу.
+
+Чтение уходит на случайную из settings.DATABASE_REPLICAS, если их нет —
+в default. Основная база читается:
+
+- в запросах, которые пишут (не GET/HEAD/OPTIONS);
+- внутри транзакций основной базы;
+- в блоке use_primary();
+- REPLICA_LAG секунд после записи: ReplicaPinMiddleware ставит
+  пользователю cookie, чтобы он сразу видел свои изменения.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+state = threading.local()
+
+
+def is_pinned():
+    return getattr(state, 'pinned', 0) > 0
+
+
+@contextmanager
+def use_primary(pinned=True):
+    """Пока блок выполняется, чтение идёт из основной базы."""
+    state.pinned = getattr(state, 'pinned', 0) + int(pinned)
+    try:
+        yield
+    finally:
+        state.pinned -= int(pinned)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if (not replicas or is_pinned()
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема реплик приходит вместе с данными (sync_replica).
+        return db not in settings.DATABASE_REPLICAS
+
+
+def pinned_by_cookie(request):
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class ReplicaPinMiddleware:
+    """Читает основную базу в пишущих запросах и недолго после них."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = (
+            request.method not in SAFE_METHODS or pinned_by_cookie(request)
+        )
+        state.wrote = False
+        with use_primary(pinned):
+            response = self.get_response(request)
+        if state.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                PIN_COOKIE, str(time.time() + settings.REPLICA_LAG),
+                max_age=settings.REPLICA_LAG, httponly=True
+            )
+        return response
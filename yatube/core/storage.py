@@ -0,0 +1,86 @@
+"""Хранилище файлов, адресуемых по содержимому.
+
+Файл сохраняется под SHA-256 своего содержимого, поэтому одинаковые
+загрузки лежат на диске в одном экземпляре. Содержимое, которое можно
+перечитать (файл из posts.images.ingest), сначала только хешируется:
+повторная загрузка не пишется на диск вовсе. Новое содержимое пишется
+во временный файл, который затем переименовывается в имя по хешу;
+поток без перемотки хешируется одновременно с записью. У уже
+существующего файла обновляется время изменения: так сборщик мусора
+видит, что файл только что понадобился снова.
+"""
+import hashlib
+import os
+from uuid import uuid4
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+CHUNK_SIZE: int = 64 * 1024
+TEMP_PREFIX = '.upload-'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def content_name(self, name, sha256):
+        """Имя вида posts/ab/abcdef….jpg: каталог из name, хеш, расширение."""
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(directory, sha256[:2], f'{sha256}{extension}')
+
+    def write_temporary(self, content):
+        """Пишет content во временный файл; возвращает путь и хеш.
+
+        Временный файл лежит в корне хранилища, на той же файловой
+        системе, что и итоговый, поэтому переименование атомарно.
+        """
+        os.makedirs(self.location, exist_ok=True)
+        path = os.path.join(self.location, f'{TEMP_PREFIX}{uuid4().hex}')
+        sha256 = hashlib.sha256()
+        # os.open с режимом 0o666 учитывает umask, как и FileSystemStorage.
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        try:
+            with os.fdopen(fd, 'wb') as temporary:
+                for chunk in content.chunks(CHUNK_SIZE):
+                    sha256.update(chunk)
+                    temporary.write(chunk)
+        except BaseException:
+            os.remove(path)
+            raise
+        return path, sha256.hexdigest()
+
+    def stored_name(self, name, content):
+        """Имя уже сохранённого файла с тем же содержимым или None."""
+        sha256 = hashlib.sha256()
+        for chunk in content.chunks(CHUNK_SIZE):
+            sha256.update(chunk)
+        stored = self.content_name(name, sha256.hexdigest())
+        if not self.exists(stored):
+            return None
+        os.utime(self.path(stored))
+        return stored
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        if content.seekable():
+            stored = self.stored_name(name, content)
+            if stored is not None:
+                return stored
+        temporary, sha256 = self.write_temporary(content)
+        name = self.content_name(name, sha256)
+        try:
+            if self.exists(name):
+                os.utime(self.path(name))
+            else:
+                path = self.path(name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temporary, path)
+                temporary = None
+                if self.file_permissions_mode is not None:
+                    os.chmod(path, self.file_permissions_mode)
+        finally:
+            if temporary is not None:
+                os.remove(temporary)
+        return name
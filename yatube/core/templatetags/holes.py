@@ -0,0 +1,16 @@
+from django import template
+
+from core.holes import is_punched, marker
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, template_name, **kwargs):
+    """Персональный фрагмент страницы: сразу или меткой для кэша."""
+    if is_punched(context.get('request')):
+        return marker(template_name, **kwargs)
+    with context.push(**kwargs):
+        return context.template.engine.get_template(
+            template_name
+        ).render(context)
@@ -0,0 +1,201 @@
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+
+from . import counts, holes, routers
+from .backends.sqlite3.base import apply_pragmas
+from .cache import SharedMemoryCache
+
+User = get_user_model()
+
+
+def write_from_other_process(location):
+    SharedMemoryCache(location, {}).set('from_child', 'значение')
+
+
+class SharedMemoryCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = SharedMemoryCache(self.location, {
+            'OPTIONS': {'MAX_ENTRIES': 4, 'CULL_FREQUENCY': 2},
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_basic_operations(self):
+        """Кэш поддерживает операции стандартного бэкенда Django."""
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertFalse(self.cache.add('key', 'other'))
+        self.assertTrue(self.cache.add('new', 'value'))
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter'), 2)
+        self.assertEqual(
+            self.cache.get_many(['key', 'new', 'missing']),
+            {'key': {'value': 1}, 'new': 'value'}
+        )
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('new'))
+
+    def test_expired_entry_is_missing(self):
+        """Просроченная запись не возвращается и может быть добавлена."""
+        self.cache.set('key', 'value', timeout=0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'fresh'))
+        self.assertEqual(self.cache.get('key'), 'fresh')
+
+    def test_lru_eviction(self):
+        """При переполнении вытесняются давно не читавшиеся записи."""
+        with mock.patch('core.cache.ACCESS_RESOLUTION', 0):
+            for key in ('a', 'b', 'c', 'd'):
+                self.cache.set(key, key)
+                time.sleep(0.01)
+            self.cache.get('a')
+            self.cache.set('e', 'e')
+        self.assertEqual(
+            set(self.cache.get_many(['a', 'b', 'c', 'd', 'e'])),
+            {'a', 'd', 'e'}
+        )
+
+    def test_shared_between_processes(self):
+        """Запись из другого процесса видна без обращения к нему."""
+        process = multiprocessing.Process(
+            target=write_from_other_process, args=(self.location,)
+        )
+        process.start()
+        process.join()
+        self.assertEqual(self.cache.get('from_child'), 'значение')
+
+
+class HolesTest(SimpleTestCase):
+    def test_kwargs_keep_types(self):
+        """Аргументы фрагмента доходят до шаблона с прежними типами."""
+        kwargs = {'follow': False, 'page': 2, 'author': 'лев'}
+        response = HttpResponse(holes.marker('hole.html', **kwargs))
+        with mock.patch.object(holes, 'render_to_string',
+                               return_value='фрагмент') as render:
+            holes.fill(response, 'request')
+        render.assert_called_once_with(
+            'hole.html', kwargs, request='request'
+        )
+        self.assertEqual(response.content.decode(), 'фрагмент')
+
+
+@override_settings(EXACT_COUNT_THRESHOLD=2)
+class EstimatedCountTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.bulk_create(
+            User(username=f'user{i}') for i in range(5)
+        )
+
+    def test_small_queryset_counted_exactly(self):
+        """Выборка не больше порога считается точно."""
+        queryset = User.objects.filter(username__in=['user0', 'user1'])
+        with mock.patch.object(counts, 'query_estimate') as estimate:
+            self.assertEqual(counts.estimated_count(queryset), 2)
+        estimate.assert_not_called()
+
+    def test_large_table_estimated_by_planner(self):
+        """Для большой таблицы берётся статистика планировщика."""
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        User.objects.create(username='after_analyze')
+        self.assertEqual(counts.planner_estimate(User), 5)
+        self.assertEqual(counts.estimated_count(User.objects.all()), 5)
+
+    def test_large_table_estimated_by_counter(self):
+        """Без статистики планировщика берётся счётчик строк таблицы."""
+        counts.recount_rows(User)
+        User.objects.create(username='not_counted')
+        with mock.patch.object(counts, 'planner_estimate',
+                               return_value=None):
+            self.assertEqual(counts.estimated_count(User.objects.all()), 5)
+            counts.change_rows(User, 1)
+            self.assertEqual(counts.estimated_count(User.objects.all()), 6)
+
+    def test_known_count_used(self):
+        """Для большой выборки используется переданное число строк."""
+        queryset = User.objects.filter(username__startswith='user')
+        self.assertEqual(counts.estimated_count(queryset, known=100), 100)
+
+    def test_known_count_called_lazily(self):
+        """Функция с числом строк вызывается только для большой выборки."""
+        queryset = User.objects.filter(username__startswith='user')
+        known = mock.Mock(return_value=100)
+        self.assertEqual(
+            counts.estimated_count(queryset, known=known, threshold=10), 5
+        )
+        known.assert_not_called()
+        self.assertEqual(counts.estimated_count(queryset, known=known), 100)
+
+
+class SQLiteBackendTest(TestCase):
+    def test_connection_tuned(self):
+        """Соединение с базой настраивается при открытии."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -64 * 1024)
+
+    def test_file_database_in_wal_mode(self):
+        """Файл базы переводится в режим WAL."""
+        with tempfile.TemporaryDirectory() as directory:
+            db = sqlite3.connect(os.path.join(directory, 'db.sqlite3'))
+            apply_pragmas(db, {'synchronous': 'OFF'})
+            self.assertEqual(
+                db.execute('PRAGMA journal_mode').fetchone()[0], 'wal'
+            )
+            self.assertEqual(db.execute('PRAGMA synchronous').fetchone()[0], 0)
+            db.close()
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_LAG=5)
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def view(self, request):
+        if request.GET.get('write'):
+            self.router.db_for_write(User)
+        return HttpResponse(self.router.db_for_read(User))
+
+    def call(self, request):
+        return routers.ReplicaPinMiddleware(self.view)(request)
+
+    def test_reads_go_to_replica(self):
+        """Чтение идёт с реплики, запись — в основную базу."""
+        self.assertEqual(self.router.db_for_read(User), 'replica')
+        self.assertEqual(self.router.db_for_write(User), 'default')
+        with routers.use_primary():
+            self.assertEqual(self.router.db_for_read(User), 'default')
+        self.assertFalse(self.router.allow_migrate('replica', 'posts'))
+
+    def test_writing_request_pins_user(self):
+        """После записи пользователь недолго читает основную базу."""
+        response = self.call(self.factory.post('/', {'text': 'пост'}))
+        self.assertEqual(response.content, b'default')
+        response = self.call(self.factory.get('/', {'write': 1}))
+        self.assertEqual(response.content, b'replica')
+        cookie = response.cookies[routers.PIN_COOKIE]
+        self.factory.cookies[routers.PIN_COOKIE] = cookie.value
+        self.assertEqual(self.call(self.factory.get('/')).content, b'default')
+        self.factory.cookies[routers.PIN_COOKIE] = str(time.time() - 1)
+        self.assertEqual(self.call(self.factory.get('/')).content, b'replica')
@@ -1,9 +1,51 @@
+from django import forms
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+
+from core.paginator import EstimatedCountPaginator
 
 from .models import Comment, Follow, Group, Post
 
 
-class PostAdmin(admin.ModelAdmin):
+class LoadedAutocompleteSelect(AutocompleteSelect):
+    """Подпись выбранного значения берётся у уже загруженного объекта."""
+
+    loaded = None
+
+    def optgroups(self, name, value, attr=None):
+        loaded = self.loaded
+        if loaded is None or [str(loaded.pk)] != list(value):
+            return super().optgroups(name, value, attr)
+        options = []
+        if not self.is_required:
+            options.append(self.create_option(name, '', '', False, 0))
+        options.append(self.create_option(
+            name, loaded.pk, self.choices.field.label_from_instance(loaded),
+            True, len(options)
+        ))
+        return [(None, options, 0)]
+
+
+class PostChangeListForm(forms.ModelForm):
+    """Строка списка постов без отдельного запроса за группой."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        widget = self.fields['group'].widget
+        widget = getattr(widget, 'widget', widget)
+        if isinstance(widget, LoadedAutocompleteSelect):
+            widget.loaded = self.instance.group
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Список, который не делает COUNT(*) по всей таблице."""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    empty_value_display = '-пусто-'
+
+
+class PostAdmin(ScalableAdmin):
     list_display = (
         'pk',
         'text',
@@ -12,10 +54,23 @@ class PostAdmin(admin.ModelAdmin):
         'group'
     )
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    autocomplete_fields = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('created',)
+    date_hierarchy = 'created'
     empty_value_display = '-пусто-'
 
+    def get_changelist_form(self, request, **kwargs):
+        return PostChangeListForm
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'group':
+            kwargs['widget'] = LoadedAutocompleteSelect(
+                db_field.remote_field, self.admin_site
+            )
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = (
@@ -23,31 +78,42 @@ class GroupAdmin(admin.ModelAdmin):
         'slug',
         'description',
     )
-    search_fields = ('title',)
-    list_filter = ('slug',)
+    search_fields = ('title', 'slug')
     empty_value_display = '-пусто-'
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(ScalableAdmin):
     list_display = (
         'post',
         'text',
         'created',
         'author',
     )
+    list_select_related = ('post', 'author')
+    autocomplete_fields = ('post', 'author', 'parent')
     search_fields = ('text',)
     list_filter = ('created',)
-    empty_value_display = '-пусто-'
+    date_hierarchy = 'created'
+    # Перенос комментария не пересчитывает path, depth и replies_count
+    # поддерева, поэтому у сохранённого комментария место в дереве
+    # не меняется.
+    tree_fields = ('post', 'parent')
 
+    def get_readonly_fields(self, request, obj=None):
+        readonly_fields = super().get_readonly_fields(request, obj)
+        if obj is not None:
+            return (*readonly_fields, *self.tree_fields)
+        return readonly_fields
 
-class FollowAdmin(admin.ModelAdmin):
+
+class FollowAdmin(ScalableAdmin):
     list_display = (
         'user',
         'author',
     )
-    search_fields = ('user',)
-    list_filter = ('author',)
-    empty_value_display = '-пусто-'
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    search_fields = ('^user__username', '^author__username')
 
 
 admin.site.register(Post, PostAdmin)
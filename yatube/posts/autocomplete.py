@@ -0,0 +1,223 @@
+"""Автодополнение имён пользователей и групп.
+
+Каждый процесс держит в памяти отсортированный список пар (терм, ссылка)
+и ищет префикс двоичным поиском (bisect). Термы — username и полное имя
+пользователя, title и slug группы в нижнем регистре.
+
+Изменения пользователей и групп публикуются в журнал событий в базе
+(AutocompleteEvent), общий для всех процессов. Перед поиском процесс
+одним запросом читает события после последнего применённого и
+применяет их к своему индексу.
+
+Каждые TRIM_EVERY событий журнал начинается заново с новым поколением,
+а старые события удаляются. Увидев событие чужого поколения (или не
+имея индекса), процесс перестраивает индекс в фоновом потоке и до
+конца перестройки отвечает по старому индексу, а без него — пустым
+списком.
+"""
+import threading
+from bisect import bisect_left, insort
+from uuid import uuid4
+
+from django.db import connections, transaction
+
+from core.routers import use_primary
+
+from .models import AutocompleteEvent, Group, User
+
+LIMIT: int = 10
+USER, GROUP = 'user', 'group'
+USER_FIELDS = {'username', 'first_name', 'last_name'}
+TRIM_EVERY: int = 10000
+# Поколение пустого журнала, пока его ни разу не начинали заново.
+FIRST_GENERATION = '0'
+
+
+class PrefixIndex:
+    def __init__(self):
+        self.entries = []
+        self.items = {}
+
+    def add(self, ref, key, label, terms):
+        self.remove(ref)
+        terms = {term.lower() for term in terms if term}
+        self.items[ref] = (key, label, terms)
+        for term in terms:
+            insort(self.entries, (term, ref))
+
+    def remove(self, ref):
+        _, _, terms = self.items.pop(ref, (None, None, ()))
+        for term in terms:
+            position = bisect_left(self.entries, (term, ref))
+            if position < len(self.entries) and (
+                self.entries[position] == (term, ref)
+            ):
+                del self.entries[position]
+
+    def search(self, prefix, limit=LIMIT):
+        """Первые limit записей, у которых есть терм с префиксом prefix."""
+        prefix = prefix.lower()
+        found = {}
+        position = bisect_left(self.entries, (prefix,))
+        while position < len(self.entries) and len(found) < limit:
+            term, ref = self.entries[position]
+            if not term.startswith(prefix):
+                break
+            found.setdefault(ref, self.items[ref])
+            position += 1
+        return [(ref, key, label) for ref, (key, label, _) in found.items()]
+
+
+def user_item(pk, username, first_name, last_name):
+    full_name = f'{first_name} {last_name}'.strip()
+    return (USER, pk), username, full_name, (username, full_name, last_name)
+
+
+def group_item(pk, slug, title):
+    return (GROUP, pk), slug, title, (slug, title)
+
+
+@use_primary()
+def load(ref):
+    """Запись для индекса по ссылке или None, если её уже нет.
+
+    Читается основная база: событие могло обогнать реплику.
+    """
+    kind, pk = ref
+    if kind == USER:
+        row = User.objects.filter(pk=pk).values_list(
+            'pk', 'username', 'first_name', 'last_name'
+        ).first()
+        return row and user_item(*row)
+    row = Group.objects.filter(pk=pk).values_list(
+        'pk', 'slug', 'title'
+    ).first()
+    return row and group_item(*row)
+
+
+def build():
+    index = PrefixIndex()
+    entries = []
+    users = User.objects.values_list(
+        'pk', 'username', 'first_name', 'last_name'
+    )
+    groups = Group.objects.values_list('pk', 'slug', 'title')
+    items = [user_item(*row) for row in users.iterator()] + [
+        group_item(*row) for row in groups.iterator()
+    ]
+    for ref, key, label, terms in items:
+        terms = {term.lower() for term in terms if term}
+        index.items[ref] = (key, label, terms)
+        entries.extend((term, ref) for term in terms)
+    entries.sort()
+    index.entries = entries
+    return index
+
+
+def apply(index, ref):
+    item = load(ref)
+    if item is None:
+        index.remove(ref)
+    else:
+        index.add(*item)
+
+
+@use_primary()
+def log_position():
+    """Поколение журнала и id последнего события."""
+    last = AutocompleteEvent.objects.order_by('-pk').values_list(
+        'generation', 'pk'
+    ).first()
+    return last or (FIRST_GENERATION, 0)
+
+
+@use_primary()
+def events_after(sequence):
+    return list(AutocompleteEvent.objects.filter(pk__gt=sequence).order_by(
+        'pk'
+    ).values_list('pk', 'generation', 'kind', 'object_id'))
+
+
+def in_background(function):
+    def run():
+        try:
+            function()
+        finally:
+            connections.close_all()
+    threading.Thread(target=run, daemon=True).start()
+
+
+class LocalIndex:
+    """Индекс процесса, поколение журнала и последнее применённое событие."""
+
+    def __init__(self):
+        self.index = None
+        self.generation = None
+        self.sequence = 0
+        self.building = False
+        self.lock = threading.Lock()
+
+    def get(self):
+        """Актуальный индекс, старый на время перестройки или None."""
+        with self.lock:
+            if self.index is not None and not self.building:
+                events = events_after(self.sequence)
+                if all(event[1] == self.generation for event in events):
+                    for pk, _, kind, object_id in events:
+                        apply(self.index, (kind, object_id))
+                        self.sequence = pk
+                    return self.index
+            start, self.building = not self.building, True
+        if start:
+            in_background(self.rebuild)
+        return self.index
+
+    def rebuild(self):
+        try:
+            # Позиция берётся до чтения таблиц: события, записанные во
+            # время перестройки, потом применятся повторно, что безопасно.
+            generation, sequence = log_position()
+            with use_primary():
+                index = build()
+            with self.lock:
+                self.index = index
+                self.generation, self.sequence = generation, sequence
+        finally:
+            with self.lock:
+                self.building = False
+
+
+local_index = LocalIndex()
+
+
+@transaction.atomic
+def start_generation():
+    """Начинает журнал заново; индексы процессов перестроятся."""
+    generation = uuid4().hex
+    AutocompleteEvent.objects.create(
+        generation=generation, kind='', object_id=0
+    )
+    AutocompleteEvent.objects.exclude(generation=generation).delete()
+
+
+def publish(ref):
+    kind, pk = ref
+    generation, _ = log_position()
+    event = AutocompleteEvent.objects.create(
+        generation=generation, kind=kind, object_id=pk
+    )
+    if event.pk % TRIM_EVERY == 0:
+        start_generation()
+
+
+def changed(kind, pk):
+    """Публикует изменение после коммита, когда его видят все процессы."""
+    transaction.on_commit(lambda: publish((kind, pk)))
+
+
+def suggest(query, limit=LIMIT):
+    query = query.strip()
+    index = query and local_index.get()
+    if not index:
+        return []
+    return index.search(query, limit)
@@ -0,0 +1,118 @@
+"""Счётчики ссылок на файлы изображений постов.
+
+Хранилище Post.image адресует файлы по содержимому, поэтому один файл
+может принадлежать нескольким постам. ImageBlob считает такие ссылки,
+а collect_garbage() удаляет файлы, на которые никто не ссылается.
+
+Ссылка добавляется UPDATE строки ImageBlob, а сборщик перед удалением
+файла блокирует эту строку и заново проверяет, что ссылок нет и файл
+давно не записывался; файл удаляется в той же транзакции, что и строка.
+Заодно удаляются давние временные файлы загрузок (core.storage).
+"""
+import os
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.routers import use_primary
+from core.storage import TEMP_PREFIX
+
+from .models import ImageBlob, Post
+
+# Файл без ссылок не удаляется сразу: его могли только что загрузить
+# для поста, который ещё сохраняется.
+GRACE = timedelta(hours=1)
+
+
+def image_storage():
+    return Post._meta.get_field('image').storage
+
+
+def add_ref(name, now):
+    referenced = ImageBlob.objects.filter(name=name)
+    if referenced.update(refs=F('refs') + 1, updated=now):
+        return
+    try:
+        with transaction.atomic():
+            ImageBlob.objects.create(name=name, refs=1)
+    except IntegrityError:
+        # Строку только что создал параллельный запрос.
+        referenced.update(refs=F('refs') + 1, updated=now)
+
+
+def recently_written(storage, name, border):
+    return storage.exists(name) and (
+        storage.get_modified_time(name) >= border
+    )
+
+
+def image_changed(old_name, new_name):
+    if old_name == new_name:
+        return
+    now = timezone.now()
+    if new_name:
+        add_ref(new_name, now)
+    if old_name:
+        ImageBlob.objects.filter(name=old_name, refs__gt=0).update(
+            refs=F('refs') - 1, updated=now
+        )
+
+
+def stored_files(storage, directory):
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield os.path.join(directory, name)
+    for subdirectory in directories:
+        yield from stored_files(storage, os.path.join(directory, subdirectory))
+
+
+def unreferenced_files(storage, border):
+    """Файлы без записи ImageBlob, например от прерванных загрузок."""
+    directory = Post._meta.get_field('image').upload_to
+    if not storage.exists(directory):
+        return
+    for name in stored_files(storage, directory):
+        if storage.get_modified_time(name) >= border:
+            continue
+        if not ImageBlob.objects.filter(name=name).exists():
+            yield name
+
+
+def stale_uploads(storage, border):
+    """Временные файлы загрузок, брошенные упавшими процессами."""
+    if not storage.exists(''):
+        return
+    _, files = storage.listdir('')
+    for name in files:
+        if name.startswith(TEMP_PREFIX) and (
+            storage.get_modified_time(name) < border
+        ):
+            yield name
+
+
+@use_primary()
+def collect_garbage(grace=GRACE):
+    """Удаляет файлы без ссылок; возвращает их имена."""
+    storage = image_storage()
+    border = timezone.now() - grace
+    removed = []
+    blobs = ImageBlob.objects.filter(refs=0, updated__lt=border)
+    for name in list(blobs.values_list('name', flat=True)):
+        with transaction.atomic():
+            # Ссылка могла появиться после выборки: проверяем под
+            # блокировкой строки, которую ждёт и add_ref().
+            blob = blobs.select_for_update().filter(name=name).first()
+            if blob is None or recently_written(storage, name, border):
+                continue
+            storage.delete(name)
+            blob.delete()
+        removed.append(name)
+    for name in list(unreferenced_files(storage, border)):
+        storage.delete(name)
+        removed.append(name)
+    for name in list(stale_uploads(storage, border)):
+        storage.delete(name)
+        removed.append(name)
+    return removed
@@ -0,0 +1,292 @@
+"""Кэширование лент.
+
+Каждая лента (главная, группа, автор, подписки читателя) имеет версию —
+случайный токен в кэше. Версия входит в ключ закэшированной страницы,
+поэтому при изменении данных достаточно сменить токен: старые записи
+перестают читаться и вытесняются сами.
+
+Блокировка пересчёта страницы берётся через cache.add, поэтому она
+общая для всех процессов, только если общий сам кэш (SharedMemoryCache).
+
+Токен версии начинается со времени её смены. Ленту, изменённую меньше
+REPLICA_LAG секунд назад, реплика может ещё не догнать, поэтому такая
+страница строится по основной базе.
+
+Версии служат и валидаторами HTTP: ETag страницы считается по ним без
+основных запросов, и при совпадении с If-None-Match отдаётся 304.
+"""
+import hashlib
+import time
+from functools import wraps
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.views.decorators.http import condition
+
+from core import holes, routers
+
+from .models import Follow, Post
+from .timeline import celebrities_followed_by, is_celebrity
+
+VERSION_PREFIX = 'feed-version'
+INDEX = 'index'
+LOCK_TIMEOUT: int = 30
+LOCK_WAIT_STEP: float = 0.05
+LOCK_WAIT_STEPS: int = 40
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def author_scope(username):
+    return f'author:{username}'
+
+
+def follow_scope(user_id):
+    return f'follow:{user_id}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def post_page_scopes(request, post_id):
+    """Версии страницы поста: сам пост, его автор и группа."""
+    post = Post.objects.filter(pk=post_id).values_list(
+        'author__username', 'group__slug'
+    ).first()
+    if post is None:
+        return [post_scope(post_id)]
+    username, slug = post
+    scopes = [post_scope(post_id), author_scope(username)]
+    if slug is not None:
+        scopes.append(group_scope(slug))
+    return scopes
+
+
+def new_token():
+    return f'{int(time.time())}-{uuid4().hex[:8]}'
+
+
+def changed_within(version, seconds):
+    """Менялась ли какая-нибудь из лент версии за последние seconds."""
+    since = time.time() - seconds
+    for token in version.split('.'):
+        stamp, _, _ = token.partition('-')
+        if stamp.isdigit() and int(stamp) > since:
+            return True
+    return False
+
+
+def version_key(scope):
+    # Слаги групп и имена авторов бывают не в ASCII, а memcached не
+    # принимает такие ключи.
+    digest = hashlib.md5(scope.encode()).hexdigest()
+    return f'{VERSION_PREFIX}:{digest}'
+
+
+def versions(*scopes):
+    """Текущие версии лент одной строкой, пригодной для ключа кэша."""
+    keys = [version_key(scope) for scope in scopes]
+    tokens = cache.get_many(keys)
+    missing = {key: new_token() for key in keys if key not in tokens}
+    if missing:
+        # Версия могла быть вытеснена: новый токен не совпадёт ни с одной
+        # старой страницей, поэтому устаревшие данные не всплывут.
+        for key, token in missing.items():
+            if not cache.add(key, token, timeout=None):
+                token = cache.get(key, token)
+            tokens[key] = token
+    return '.'.join(tokens[key] for key in keys)
+
+
+def set_new_versions(scopes):
+    cache.set_many(
+        {version_key(scope): new_token() for scope in scopes},
+        timeout=None
+    )
+
+
+def bump(*scopes):
+    set_new_versions(scopes)
+    # Запрос, прочитавший данные до коммита, мог закэшировать их уже под
+    # новой версией, поэтому после коммита версия меняется ещё раз.
+    transaction.on_commit(lambda: set_new_versions(scopes))
+
+
+def follow_feed_scopes(user):
+    """Версии ленты подписок: своя и авторов, читаемых при запросе."""
+    return [follow_scope(user.pk)] + [
+        author_scope(username)
+        for _, username in celebrities_followed_by(user)
+    ]
+
+
+def post_changed(post, old_group=None):
+    scopes = {INDEX, author_scope(post.author.username), post_scope(post.pk)}
+    for group in (post.group, old_group):
+        if group is not None:
+            scopes.add(group_scope(group.slug))
+    if not is_celebrity(post.author):
+        scopes.update(
+            follow_scope(user_id) for user_id in Follow.objects.filter(
+                author=post.author
+            ).values_list('user_id', flat=True).iterator()
+        )
+    bump(*scopes)
+
+
+def comment_changed(comment):
+    bump(post_scope(comment.post_id))
+
+
+def group_changed(group, old_slug=None):
+    scopes = {INDEX, group_scope(group.slug)}
+    if old_slug:
+        scopes.add(group_scope(old_slug))
+    bump(*scopes)
+
+
+def follow_changed(follow):
+    bump(follow_scope(follow.user_id), author_scope(follow.author.username))
+
+
+def audience(request, shared=True):
+    """Кому подходит закэшированная страница.
+
+    Гости получают страницу целиком. Вошедшим пользователям общая страница
+    отдаётся с дырками под персональные фрагменты, а страница, которая
+    целиком зависит от пользователя, хранится для каждого отдельно.
+    """
+    if not request.user.is_authenticated:
+        return 'anon'
+    if shared:
+        return 'shared'
+    return request.user.pk
+
+
+def feed_cache_key(request, scopes, shared=True, version=None):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    version = version or versions(*scopes)
+    return f'feed:{version}:{audience(request, shared)}:{path}'
+
+
+def resolve_scopes(scopes, request, kwargs):
+    resolved = []
+    for scope in scopes:
+        if callable(scope):
+            resolved.extend(scope(request, **kwargs))
+        else:
+            resolved.append(scope.format(**kwargs))
+    return resolved
+
+
+def version_etag(*scopes, personal=False):
+    """etag_func для condition(): версии лент и адрес запроса.
+
+    ETag меняется вместе с версией любой из лент scopes (те же шаблоны,
+    что у cache_feed). Если personal, в него входят ещё пользователь и
+    CSRF-cookie: страница с формами и шапкой у каждого своя.
+    """
+    def etag(request, *args, **kwargs):
+        version = versions(*resolve_scopes(scopes, request, kwargs))
+        raw = f'{version}:{request.get_full_path()}'
+        if personal:
+            csrf = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+            raw = f'{raw}:{audience(request, shared=False)}:{csrf}'
+        return hashlib.md5(raw.encode()).hexdigest()
+    return etag
+
+
+def conditional_page(*scopes):
+    """Отвечает 304, если версии лент не менялись с прошлого запроса.
+
+    Ставится над cache_feed: совпавший ETag не доходит ни до кэша
+    страниц, ни до представления.
+    """
+    return condition(etag_func=version_etag(*scopes, personal=True))
+
+
+def is_cacheable(response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+    )
+
+
+def wait_for_entry(key):
+    """Ждёт, пока страницу построит запрос, захвативший блокировку."""
+    for _ in range(LOCK_WAIT_STEPS):
+        time.sleep(LOCK_WAIT_STEP)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def get_or_render(key, timeout, grace, render):
+    """Single-flight со stale-while-revalidate для одного ключа."""
+    lock_key = f'{key}:lock'
+    entry = cache.get(key)
+    if entry is not None and entry[0] > time.time():
+        return entry[1]
+    locked = cache.add(lock_key, True, LOCK_TIMEOUT)
+    if not locked:
+        if entry is None:
+            entry = wait_for_entry(key)
+        if entry is not None:
+            return entry[1]
+    try:
+        response = render()
+        if is_cacheable(response):
+            cache.set(key, (time.time() + timeout, response), timeout + grace)
+    finally:
+        if locked:
+            # Чужую блокировку не снимаем: её владелец ещё строит страницу.
+            cache.delete(lock_key)
+    return response
+
+
+def cache_feed(timeout, *scopes, grace=None, shared=True):
+    """Кэширует ленту под ключом с версиями перечисленных лент.
+
+    Элементы scopes — шаблоны строк, в которые подставляются именованные
+    аргументы представления ('group:{slug}'), или функции
+    (request, **kwargs), возвращающие список лент.
+
+    Пересчитывает страницу только запрос, захвативший блокировку
+    (single-flight); остальные в течение grace секунд после истечения
+    timeout получают устаревшую копию (stale-while-revalidate).
+
+    Если shared, вошедшие пользователи делят одну копию страницы, а
+    фрагменты из тега {% hole %} дорисовываются для каждого запроса.
+    """
+    if grace is None:
+        grace = settings.FEED_CACHE_GRACE
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+            resolved = resolve_scopes(scopes, request, kwargs)
+            version = versions(*resolved)
+            key = feed_cache_key(request, resolved, shared, version)
+            punched = audience(request, shared) == 'shared'
+            if punched:
+                holes.punch(request)
+            fresh = changed_within(version, settings.REPLICA_LAG)
+            with routers.use_primary(fresh):
+                response = get_or_render(
+                    key, timeout, grace,
+                    lambda: view_func(request, *args, **kwargs)
+                )
+            if punched:
+                return holes.fill(response, request)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,150 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Число постов ведётся у автора (UserStats) и у группы (Group).
+
+Счётчики меняются F()-выражениями в той же транзакции, что и запись,
+и не опускаются ниже нуля, даже если успели разойтись с данными;
+recount_all() пересчитывает их с нуля, если они разошлись с данными.
+Число строк в таблицах постов, комментариев и подписок ведёт
+core.counts.
+"""
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+
+from core import counts
+
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+def shifted(field, delta):
+    """Значение счётчика field после изменения на delta, но не меньше 0."""
+    return Greatest(F(field) + delta, 0)
+
+
+def change_user_stats(user_id, create=True, **deltas):
+    updated = UserStats.objects.filter(user_id=user_id).update(**{
+        field: shifted(field, delta) for field, delta in deltas.items()
+    })
+    if not updated and create:
+        recount_user(user_id)
+
+
+def change_comments_count(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=shifted('comments_count', delta)
+    )
+
+
+def change_replies_count(comment_id, delta):
+    if comment_id is not None:
+        Comment.objects.filter(pk=comment_id).update(
+            replies_count=shifted('replies_count', delta)
+        )
+
+
+def change_group_posts(group_id, delta):
+    if group_id is not None:
+        Group.objects.filter(pk=group_id).update(
+            posts_count=shifted('posts_count', delta)
+        )
+
+
+def post_added(post):
+    change_user_stats(post.author_id, posts_count=1)
+    change_group_posts(post.group_id, 1)
+    counts.change_rows(Post, 1)
+
+
+def post_moved(post, old_group):
+    old_group_id = old_group and old_group.pk
+    if old_group_id != post.group_id:
+        change_group_posts(old_group_id, -1)
+        change_group_posts(post.group_id, 1)
+
+
+def post_removed(post):
+    change_user_stats(post.author_id, create=False, posts_count=-1)
+    change_group_posts(post.group_id, -1)
+    counts.change_rows(Post, -1)
+
+
+def comment_added(comment):
+    change_comments_count(comment.post_id, 1)
+    change_replies_count(comment.parent_id, 1)
+    counts.change_rows(Comment, 1)
+
+
+def comment_removed(comment):
+    change_comments_count(comment.post_id, -1)
+    change_replies_count(comment.parent_id, -1)
+    counts.change_rows(Comment, -1)
+
+
+def follow_added(follow):
+    change_user_stats(follow.author_id, followers_count=1)
+    change_user_stats(follow.user_id, following_count=1)
+    counts.change_rows(Follow, 1)
+
+
+def follow_removed(follow):
+    change_user_stats(follow.author_id, create=False, followers_count=-1)
+    change_user_stats(follow.user_id, create=False, following_count=-1)
+    counts.change_rows(Follow, -1)
+
+
+def recount_user(user_id):
+    stats, _ = UserStats.objects.update_or_create(user_id=user_id, defaults={
+        'posts_count': Post.objects.filter(author_id=user_id).count(),
+        'followers_count': Follow.objects.filter(author_id=user_id).count(),
+        'following_count': Follow.objects.filter(user_id=user_id).count(),
+    })
+    return stats
+
+
+def user_stats(user):
+    """Счётчики пользователя; недостающая строка создаётся пересчётом.
+
+    Её нет, например, у пользователей из bulk_create.
+    """
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        user.stats = recount_user(user.pk)
+        return user.stats
+
+
+def followed_posts_count(user):
+    """Число постов в ленте подписок по счётчикам авторов."""
+    return UserStats.objects.filter(user__following__user=user).aggregate(
+        total=Sum('posts_count')
+    )['total'] or 0
+
+
+def count_by(model, field):
+    """Подзапрос с числом строк model, ссылающихся на внешнюю строку."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+@transaction.atomic
+def recount_all():
+    UserStats.objects.bulk_create(
+        (UserStats(user_id=user_id) for user_id in User.objects.filter(
+            stats__isnull=True
+        ).values_list('pk', flat=True).iterator()),
+        batch_size=500,
+    )
+    UserStats.objects.update(
+        posts_count=count_by(Post, 'author'),
+        followers_count=count_by(Follow, 'author'),
+        following_count=count_by(Follow, 'user'),
+    )
+    Group.objects.update(posts_count=count_by(Post, 'group'))
+    Post.objects.update(comments_count=count_by(Comment, 'post'))
+    Comment.objects.update(replies_count=count_by(Comment, 'parent'))
+    for model in (Post, Comment, Follow):
+        counts.recount_rows(model)
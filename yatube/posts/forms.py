@@ -1,5 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
 
+from .images import ingest
 from .models import Comment, Post
 
 
@@ -8,6 +11,18 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            try:
+                return ingest(image)
+            except (OSError, Image.DecompressionBombError):
+                raise forms.ValidationError(
+                    'Не удалось обработать изображение: файл повреждён '
+                    'или слишком велик.'
+                )
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
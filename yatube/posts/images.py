@@ -0,0 +1,152 @@
+"""Обработка изображений, загруженных к постам.
+
+Изображение уменьшается до POST_IMAGE_MAX_SIZE, поворачивается по EXIF,
+после чего метаданные отбрасываются, и пересохраняется в WebP (если
+Pillow собран с его поддержкой) или в JPEG. Прозрачные изображения без
+WebP сохраняются в PNG. GIF пересохраняется в GIF покадрово, чтобы не
+потерять анимацию: кадры уменьшаются так же, а из метаданных остаются
+только прозрачность, длительности кадров и число повторов. Pillow
+сохраняет анимацию целиком из памяти, поэтому число кадров и пикселей
+в них ограничено (POST_GIF_MAX_FRAMES, POST_GIF_MAX_PIXELS).
+
+Django сам сбрасывает крупные загрузки во временный файл, Pillow читает
+его по частям, а результат пишется в SpooledTemporaryFile, который
+уходит на диск, как только перерастает SPOOL_SIZE.
+"""
+import base64
+import os
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image, ImageOps, ImageSequence, features
+
+SPOOL_SIZE: int = 1024 * 1024
+PLACEHOLDER_SIZE = (16, 16)
+ANIMATED_FORMATS = {'GIF'}
+FRAME_INFO = {'transparency', 'duration', 'background'}
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif'}
+
+
+def has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+
+
+def output_format(image):
+    if features.check('webp'):
+        return 'WEBP'
+    if has_alpha(image):
+        return 'PNG'
+    return 'JPEG'
+
+
+def process(image):
+    """Уменьшенная и повёрнутая копия изображения без метаданных."""
+    max_size = settings.POST_IMAGE_MAX_SIZE
+    if image.format == 'JPEG':
+        # JPEG декодируется сразу в уменьшенном масштабе.
+        image.draft('RGB', max_size)
+    image = ImageOps.exif_transpose(image)
+    image = image.convert('RGBA' if has_alpha(image) else 'RGB')
+    image.thumbnail(max_size, Image.LANCZOS)
+    return image
+
+
+def process_frames(source):
+    """Уменьшенные кадры анимации без лишних метаданных.
+
+    Кадры декодируются по одному, и на первом кадре сверх
+    POST_GIF_MAX_FRAMES или POST_GIF_MAX_PIXELS разбор прерывается.
+    """
+    width, height = source.size
+    frames = []
+    for index, frame in enumerate(ImageSequence.Iterator(source), 1):
+        if (
+            index > settings.POST_GIF_MAX_FRAMES
+            or index * width * height > settings.POST_GIF_MAX_PIXELS
+        ):
+            raise Image.DecompressionBombError(
+                f'Анимация больше {settings.POST_GIF_MAX_FRAMES} кадров '
+                f'или {settings.POST_GIF_MAX_PIXELS} пикселей'
+            )
+        frame = frame.copy()
+        frame.info = {
+            key: value for key, value in frame.info.items()
+            if key in FRAME_INFO
+        }
+        frame.thumbnail(settings.POST_IMAGE_MAX_SIZE, Image.LANCZOS)
+        frames.append(frame)
+    return frames
+
+
+def save_frames(source, output):
+    frames = process_frames(source)
+    options = {}
+    if 'loop' in source.info:
+        options['loop'] = source.info['loop']
+    frames[0].save(
+        output,
+        'GIF',
+        save_all=True,
+        append_images=frames[1:],
+        duration=[frame.info.get('duration', 0) for frame in frames],
+        optimize=True,
+        **options,
+    )
+
+
+def ingest(upload):
+    """Загруженный файл, пересохранённый для хранения.
+
+    Испорченный файл или «бомба распаковки» дают OSError или
+    Image.DecompressionBombError.
+    """
+    upload.seek(0)
+    output = SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    with Image.open(upload) as source:
+        if source.format in ANIMATED_FORMATS:
+            image_format = source.format
+            save_frames(source, output)
+        else:
+            image = process(source)
+            image_format = output_format(image)
+            image.save(
+                output,
+                image_format,
+                quality=settings.POST_IMAGE_QUALITY,
+                optimize=True,
+            )
+    size = output.tell()
+    output.seek(0)
+    name = os.path.splitext(os.path.basename(upload.name))[0]
+    return UploadedFile(
+        file=output,
+        name=f'{name}.{EXTENSIONS[image_format]}',
+        content_type=Image.MIME[image_format],
+        size=size,
+    )
+
+
+def placeholder(image):
+    """Крошечная копия изображения в data URI (LQIP)."""
+    preview = image.convert('RGB')
+    preview.thumbnail(PLACEHOLDER_SIZE)
+    content = BytesIO()
+    preview.save(content, 'JPEG', quality=40)
+    encoded = base64.b64encode(content.getvalue()).decode()
+    return f'data:image/jpeg;base64,{encoded}'
+
+
+def describe(file):
+    """Ширина, высота и LQIP-заглушка изображения из файла."""
+    file.seek(0)
+    try:
+        with Image.open(file) as image:
+            return (*image.size, placeholder(image))
+    except OSError:
+        return None, None, ''
+    finally:
+        file.seek(0)
@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from posts.blobs import GRACE, collect_garbage
+
+
+class Command(BaseCommand):
+    help = 'Удаляет файлы изображений, на которые не ссылается ни один пост.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=int(GRACE.total_seconds()),
+            help='Не трогать файлы, изменённые за последние N секунд.'
+        )
+
+    def handle(self, *args, **options):
+        removed = collect_garbage(timedelta(seconds=options['grace']))
+        for name in removed:
+            self.stdout.write(name)
+        self.stdout.write(
+            self.style.SUCCESS(f'Удалено файлов: {len(removed)}')
+        )
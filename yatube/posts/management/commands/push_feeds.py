@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts import cache, timeline
+
+
+class Command(BaseCommand):
+    help = (
+        'Раскладывает по лентам подписчиков посты авторов, у которых '
+        'стало мало подписчиков.'
+    )
+
+    def handle(self, *args, **options):
+        authors = list(timeline.authors_to_push())
+        for author_id in authors:
+            followers = timeline.push_feed(author_id)
+            cache.bump(*(cache.follow_scope(user_id) for user_id in followers))
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты заполнены для авторов: {len(authors)}'
+        ))
@@ -0,0 +1,78 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.routers import use_primary
+from posts import cache
+from posts.models import Post
+from posts.thumbnails import generate, worker_lag
+
+logger = logging.getLogger(__name__)
+
+
+def build(post):
+    try:
+        built = generate(post)
+    except Exception:
+        logger.exception('Не удалось построить миниатюры для %s', post.image)
+        return
+    if not built:
+        return
+    # Страницы и фрагменты с заглушкой вместо миниатюры устарели.
+    cache.post_changed(post)
+
+
+class Command(BaseCommand):
+    help = 'Строит миниатюры изображений новых и изменённых постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.THUMBNAIL_WORKERS
+        )
+        parser.add_argument('--interval', type=float, default=2.0)
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Обработать накопившиеся посты и завершиться.'
+        )
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Начать с самого первого поста, а не с недавних.'
+        )
+
+    def handle(self, *args, **options):
+        since = None if options['all'] else timezone.now()
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                since, posts = self.changed_since(since)
+                if options['workers'] > 1:
+                    list(pool.map(build, posts))
+                else:
+                    for post in posts:
+                        build(post)
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('Миниатюры построены'))
+
+    @staticmethod
+    @use_primary()
+    def changed_since(since):
+        posts = Post.objects.exclude(image='').select_related(
+            'author', 'group'
+        ).only(
+            'image', 'image_width', 'updated', 'author__username',
+            'group__slug'
+        )
+        if since is not None:
+            # Окно перекрывается, чтобы не терять посты с тем же временем
+            # изменения и закоммиченные позже соседей; построенные
+            # миниатюры generate пропускает.
+            posts = posts.filter(updated__gte=since - worker_lag())
+        posts = list(posts.order_by('updated'))
+        if posts:
+            since = posts[-1].updated
+        return since, posts
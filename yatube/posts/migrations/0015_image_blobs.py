@@ -0,0 +1,42 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:56
+
+import core.storage
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_image_blobs(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    ImageBlob = apps.get_model('posts', 'ImageBlob')
+    ImageBlob.objects.bulk_create(
+        (ImageBlob(name=row['image'], refs=row['refs'])
+         for row in Post.objects.exclude(image='').order_by().values(
+             'image'
+        ).annotate(refs=Count('pk')).iterator()),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_updated_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Файл')),
+                ('refs', models.PositiveIntegerField(default=0, verbose_name='Число ссылок')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Дата изменения')),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Загрузи изображение для поста', storage=core.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Изображение'),
+        ),
+        migrations.RunPython(fill_image_blobs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:57
+
+import base64
+from io import BytesIO
+
+from django.db import migrations, models
+from PIL import Image
+
+# Копия posts.images.describe на момент миграции: миграция не должна
+# меняться вместе с кодом приложения.
+PLACEHOLDER_SIZE = (16, 16)
+
+
+def describe(file):
+    with Image.open(file) as image:
+        preview = image.convert('RGB')
+        preview.thumbnail(PLACEHOLDER_SIZE)
+        content = BytesIO()
+        preview.save(content, 'JPEG', quality=40)
+        encoded = base64.b64encode(content.getvalue()).decode()
+        return (*image.size, f'data:image/jpeg;base64,{encoded}')
+
+
+def fill_image_dimensions(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    for post in Post.objects.exclude(image='').iterator():
+        try:
+            with post.image.open('rb') as file:
+                width, height, placeholder = describe(file)
+        except OSError:
+            continue
+        Post.objects.filter(pk=post.pk).update(
+            image_width=width,
+            image_height=height,
+            image_placeholder=placeholder,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_image_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Высота изображения'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_placeholder',
+            field=models.TextField(blank=True, editable=False, verbose_name='Заглушка изображения'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Ширина изображения'),
+        ),
+        migrations.RunPython(fill_image_dimensions, migrations.RunPython.noop),
+    ]
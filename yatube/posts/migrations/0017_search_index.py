@@ -0,0 +1,43 @@
+# Generated by Django 2.2.16 on 2026-10-18 10:05
+
+from django.db import migrations
+
+CREATE_SEARCH_TABLE = '''
+CREATE VIRTUAL TABLE posts_search USING fts5(
+    body,
+    post_id UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+'''
+
+FILL_SEARCH_TABLE = '''
+INSERT INTO posts_search (rowid, body, post_id)
+SELECT 2 * id, text, id FROM posts_post
+UNION ALL
+SELECT 2 * id + 1, text, post_id FROM posts_comment
+'''
+
+
+def create_search_table(apps, schema_editor):
+    # Полнотекстовый индекс есть только в SQLite, для остальных баз
+    # posts.search ищет через icontains.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_SEARCH_TABLE)
+    schema_editor.execute(FILL_SEARCH_TABLE)
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_image_dimensions'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 500
+# Копия Comment.path_step на момент миграции: миграция не должна
+# меняться вместе с моделью.
+PATH_STEP = 7
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def path_step(pk):
+    digits = ''
+    while pk:
+        pk, digit = divmod(pk, 36)
+        digits = DIGITS[digit] + digits
+    return digits.rjust(PATH_STEP, '0')
+
+
+def fill_comment_paths(apps, schema_editor):
+    # До веток все комментарии — корневые.
+    Comment = apps.get_model('posts', 'Comment')
+    batch = []
+    for comment in Comment.objects.only('pk').order_by().iterator():
+        comment.path = path_step(comment.pk)
+        batch.append(comment)
+        if len(batch) == BATCH_SIZE:
+            Comment.objects.bulk_update(batch, ['path'])
+            batch = []
+    Comment.objects.bulk_update(batch, ['path'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_comment_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Глубина'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='posts.Comment', verbose_name='Ответ на'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Путь в дереве'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='replies_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число ответов'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'depth', '-created', '-id'], name='comment_post_depth'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='comment_post_path'),
+        ),
+        migrations.RunPython(fill_comment_paths, migrations.RunPython.noop),
+    ]
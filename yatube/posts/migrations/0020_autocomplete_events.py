@@ -0,0 +1,22 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_comment_threads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AutocompleteEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('generation', models.CharField(max_length=32, verbose_name='Поколение журнала')),
+                ('kind', models.CharField(max_length=5, verbose_name='Тип записи')),
+                ('object_id', models.PositiveIntegerField(verbose_name='Запись')),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_pulled_feeds(apps, schema_editor):
+    UserStats = apps.get_model('posts', 'UserStats')
+    UserStats.objects.filter(
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT
+    ).update(feed_pulled=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_autocomplete_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='feed_pulled',
+            field=models.BooleanField(default=False, verbose_name='Посты подмешиваются при чтении'),
+        ),
+        migrations.RunPython(mark_pulled_feeds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:10
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_posts_count(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    Group.objects.update(posts_count=Coalesce(Subquery(
+        Post.objects.filter(group=OuterRef('pk')).order_by().values(
+            'group'
+        ).annotate(total=Count('pk')).values('total')
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_feed_pulled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число постов'),
+        ),
+        migrations.RunPython(fill_posts_count, migrations.RunPython.noop),
+    ]
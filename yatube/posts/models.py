@@ -2,6 +2,9 @@ from django.contrib.auth import get_user_model
 from django.db import models
 
 from core.models import CreatedModel
+from core.storage import ContentAddressedStorage
+
+from .images import describe
 
 User = get_user_model()
 
@@ -29,16 +32,76 @@ class Post(CreatedModel):
     image = models.ImageField(
         'Изображение',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True,
         help_text='Загрузи изображение для поста'
     )
+    image_width = models.PositiveIntegerField(
+        'Ширина изображения',
+        blank=True,
+        null=True,
+        editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота изображения',
+        blank=True,
+        null=True,
+        editable=False
+    )
+    image_placeholder = models.TextField(
+        'Заглушка изображения',
+        blank=True,
+        editable=False
+    )
+    updated = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False
+    )
+
+    # Счётчики меняются только F()-выражениями, сохранение объекта
+    # не должно перезаписывать их устаревшим значением.
+    COUNTER_FIELDS = ('comments_count',)
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(
+                fields=['author', '-created', '-id'],
+                name='post_author_created'
+            ),
+            models.Index(
+                fields=['group', '-created', '-id'],
+                name='post_group_created'
+            ),
+            models.Index(fields=['-created', '-id'], name='post_created'),
+            models.Index(fields=['updated'], name='post_updated'),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        if not self.image:
+            self.image_width = self.image_height = None
+            self.image_placeholder = ''
+        elif not self.image._committed:
+            # Размеры берутся из загруженного файла, чтобы потом не
+            # открывать его при каждой отрисовке.
+            (self.image_width, self.image_height,
+             self.image_placeholder) = describe(self.image)
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class Group(models.Model):
     title = models.CharField(
@@ -52,12 +115,43 @@ class Group(models.Model):
     description = models.TextField(
         verbose_name='Описание'
     )
+    posts_count = models.PositiveIntegerField(
+        'Число постов',
+        default=0,
+        editable=False
+    )
+
+    COUNTER_FIELDS = ('posts_count',)
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class Comment(CreatedModel):
+    """Комментарий или ответ на другой комментарий.
+
+    path — материализованный путь: id предков и самого комментария,
+    каждый записан PATH_STEP символами в base36. Сортировка по path
+    даёт обход дерева в глубину, а поддерево комментария — диапазон
+    path, который читается одним запросом по индексу (post, path).
+    """
+    PATH_STEP: int = 7
+    # Ответ на комментарий этой глубины становится ответом его родителю,
+    # чтобы путь помещался в поле.
+    MAX_DEPTH: int = 30
+    # Символ больше любой цифры base36: path + PATH_END ограничивает
+    # поддерево сверху.
+    PATH_END = '~'
+
     post = models.ForeignKey(
         'Post',
         on_delete=models.CASCADE,
@@ -74,13 +168,73 @@ class Comment(CreatedModel):
         'Текст комментария',
         help_text='Введите текст комментария'
     )
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        related_name='replies',
+        blank=True,
+        null=True,
+        verbose_name='Ответ на'
+    )
+    path = models.CharField(
+        'Путь в дереве', max_length=255, blank=True, editable=False
+    )
+    depth = models.PositiveSmallIntegerField(
+        'Глубина', default=0, editable=False
+    )
+    replies_count = models.PositiveIntegerField(
+        'Число ответов', default=0, editable=False
+    )
+
+    COUNTER_FIELDS = ('replies_count',)
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created'
+            ),
+            models.Index(
+                fields=['-created', '-id'], name='comment_created'
+            ),
+            models.Index(
+                fields=['post', 'depth', '-created', '-id'],
+                name='comment_post_depth'
+            ),
+            models.Index(fields=['post', 'path'], name='comment_post_path'),
+        ]
 
     def __str__(self):
         return self.text
 
+    @classmethod
+    def path_step(cls, pk):
+        digits = ''
+        while pk:
+            pk, digit = divmod(pk, 36)
+            digits = '0123456789abcdefghijklmnopqrstuvwxyz'[digit] + digits
+        return digits.rjust(cls.PATH_STEP, '0')
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            if kwargs.get('update_fields') is None:
+                kwargs['update_fields'] = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key
+                    and field.name not in self.COUNTER_FIELDS
+                ]
+            return super().save(*args, **kwargs)
+        parent = self.parent
+        if parent is not None and parent.depth >= self.MAX_DEPTH:
+            parent = self.parent = parent.parent
+        if parent is not None:
+            self.post_id, self.depth = parent.post_id, parent.depth + 1
+        super().save(*args, **kwargs)
+        # id известен только после вставки.
+        self.path = (parent.path if parent else '') + self.path_step(self.pk)
+        Comment.objects.filter(pk=self.pk).update(path=self.path)
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -102,3 +256,96 @@ class Follow(models.Model):
                 fields=['user', 'author'], name='unique_author_user_following'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'], name='follow_author_user'
+            ),
+        ]
+
+
+class FeedEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        'Post',
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор поста'
+    )
+    created = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ['-created']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-created', '-id'], name='feed_user_created'
+            ),
+            models.Index(fields=['user', 'author'], name='feed_user_author'),
+        ]
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, обновляемые при записи."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков',
+        default=0
+    )
+    following_count = models.PositiveIntegerField('Число подписок', default=0)
+    # Посты автора не раскладываются по лентам подписок, а подмешиваются
+    # при чтении (posts.timeline).
+    feed_pulled = models.BooleanField(
+        'Посты подмешиваются при чтении', default=False
+    )
+
+    def __str__(self):
+        return str(self.user)
+
+
+class ImageBlob(models.Model):
+    """Файл изображения и число постов, которые на него ссылаются."""
+    name = models.CharField('Файл', max_length=100, unique=True)
+    refs = models.PositiveIntegerField('Число ссылок', default=0)
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+
+class AutocompleteEvent(models.Model):
+    """Изменение пользователя или группы для индексов автодополнения.
+
+    Индексы процессов применяют события по возрастанию id. Событие
+    другого поколения означает, что журнал начат заново и индекс нужно
+    перестроить (posts.autocomplete).
+    """
+    id = models.BigAutoField(primary_key=True)
+    generation = models.CharField('Поколение журнала', max_length=32)
+    kind = models.CharField('Тип записи', max_length=5)
+    object_id = models.PositiveIntegerField('Запись')
+
+    def __str__(self):
+        return f'{self.generation}:{self.pk} {self.kind} {self.object_id}'
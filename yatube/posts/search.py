@@ -0,0 +1,166 @@
+"""Полнотекстовый поиск по постам и комментариям.
+
+Бэкенд задаётся настройкой POST_SEARCH_BACKEND (путь к классу). По
+умолчанию в SQLite используется виртуальная таблица FTS5 posts_search,
+в остальных базах — поиск через icontains без ранжирования.
+
+Результаты — посты, отсортированные по (score, id): чем меньше score,
+тем выше пост. Комментарий, подходящий под запрос, поднимает свой пост.
+Страницы выбираются по ключу (score, id) из курсора, без OFFSET.
+"""
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from django.utils.module_loading import import_string
+
+from .models import Post
+from .utils import COUNT_POST
+
+SEARCH_TABLE = 'posts_search'
+TOKEN = re.compile(r'\w+')
+
+
+def match_expression(query):
+    """Запрос пользователя в синтаксисе FTS5: все слова, последнее — префикс.
+
+    Слова берутся в кавычки, поэтому операторы FTS5 из запроса не
+    интерпретируются.
+    """
+    tokens = TOKEN.findall(query)
+    if not tokens:
+        return ''
+    return ' '.join(f'"{token}"' for token in tokens) + '*'
+
+
+def encode_cursor(score, post_id):
+    return urlsafe_base64_encode(force_bytes(f'{score!r}|{post_id}'))
+
+
+def decode_cursor(cursor):
+    """Ключ (score, id) из курсора, ValueError для испорченного токена."""
+    try:
+        score, post_id = force_str(urlsafe_base64_decode(cursor)).split('|')
+    except (TypeError, UnicodeDecodeError):
+        raise ValueError('Некорректный курсор')
+    return float(score), int(post_id)
+
+
+class SearchBackend:
+    """Поиск через icontains, для баз без полнотекстового индекса."""
+
+    def index_post(self, post):
+        pass
+
+    def remove_post(self, post):
+        pass
+
+    def index_comment(self, comment):
+        pass
+
+    def remove_comment(self, comment):
+        pass
+
+    def search(self, query, after=None, limit=COUNT_POST):
+        """Список пар (score, id поста) после ключа after."""
+        tokens = TOKEN.findall(query)
+        if not tokens:
+            return []
+        posts = Post.objects.all()
+        for token in tokens:
+            posts = posts.filter(
+                Q(text__icontains=token) | Q(comments__text__icontains=token)
+            )
+        if after is not None:
+            posts = posts.filter(pk__lt=after[1])
+        # Без ранжирования свежие посты идут первыми.
+        ids = posts.order_by('-pk').values_list('pk', flat=True).distinct()
+        return [(float(-pk), pk) for pk in ids[:limit]]
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """Поиск по виртуальной таблице FTS5 с ранжированием bm25.
+
+    Ранг берётся из скрытого столбца rank: функция bm25() недоступна
+    внутри агрегирующего запроса.
+
+    rowid документа — 2 * id для поста и 2 * id + 1 для комментария.
+    """
+
+    def write(self, rowid, body=None, post_id=None):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [rowid]
+            )
+            if body is not None:
+                cursor.execute(
+                    f'INSERT INTO {SEARCH_TABLE} (rowid, body, post_id) '
+                    'VALUES (%s, %s, %s)',
+                    [rowid, body, post_id]
+                )
+
+    def index_post(self, post):
+        self.write(2 * post.pk, post.text, post.pk)
+
+    def remove_post(self, post):
+        self.write(2 * post.pk)
+
+    def index_comment(self, comment):
+        self.write(2 * comment.pk + 1, comment.text, comment.post_id)
+
+    def remove_comment(self, comment):
+        self.write(2 * comment.pk + 1)
+
+    def search(self, query, after=None, limit=COUNT_POST):
+        expression = match_expression(query)
+        if not expression:
+            return []
+        params = [expression]
+        condition = ''
+        if after is not None:
+            condition = 'WHERE score > %s OR (score = %s AND post_id > %s)'
+            params += [after[0], after[0], after[1]]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT score, post_id FROM ('
+                'SELECT MIN(rank) AS score, post_id '
+                f'FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s '
+                f'GROUP BY post_id) {condition} '
+                'ORDER BY score, post_id LIMIT %s',
+                params + [limit]
+            )
+            return cursor.fetchall()
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    path = settings.POST_SEARCH_BACKEND
+    if path is None:
+        if (
+            connection.vendor == 'sqlite'
+            and SEARCH_TABLE in connection.introspection.table_names()
+        ):
+            return SQLiteSearchBackend()
+        return SearchBackend()
+    return import_string(path)()
+
+
+def search_posts(query, cursor=None, limit=COUNT_POST):
+    """Страница найденных постов и курсор следующей страницы."""
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError:
+            pass
+    rows = get_backend().search(query, after, limit + 1)
+    posts = Post.objects.select_related('author', 'group').in_bulk(
+        [post_id for _, post_id in rows[:limit]]
+    )
+    page = [posts[post_id] for _, post_id in rows[:limit] if post_id in posts]
+    next_cursor = encode_cursor(*rows[limit - 1]) if len(rows) > limit else ''
+    return page, next_cursor
@@ -0,0 +1,94 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import autocomplete, blobs, cache, counters, search, timeline
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not autocomplete.USER_FIELDS & set(update_fields):
+        # Например, вход пользователя меняет только last_login.
+        return
+    autocomplete.changed(autocomplete.USER, instance.pk)
+
+
+@receiver(pre_save, sender=Post)
+def remember_old_state(sender, instance, **kwargs):
+    instance.old_group, instance.old_image = None, ''
+    old = instance.pk and Post.objects.select_related('group').only(
+        'group', 'image'
+    ).filter(pk=instance.pk).first()
+    if old:
+        instance.old_group, instance.old_image = old.group, old.image.name
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.post_added(instance)
+        timeline.fan_out(instance)
+    else:
+        counters.post_moved(instance, instance.old_group)
+    blobs.image_changed(instance.old_image, instance.image.name)
+    search.get_backend().index_post(instance)
+    cache.post_changed(instance, instance.old_group)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.post_removed(instance)
+    blobs.image_changed(instance.image.name, '')
+    search.get_backend().remove_post(instance)
+    cache.post_changed(instance)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.comment_added(instance)
+    search.get_backend().index_comment(instance)
+    cache.comment_changed(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.comment_removed(instance)
+    search.get_backend().remove_comment(instance)
+    cache.comment_changed(instance)
+
+
+@receiver(pre_save, sender=Group)
+def remember_old_slug(sender, instance, **kwargs):
+    instance.old_slug = instance.pk and Group.objects.filter(
+        pk=instance.pk
+    ).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    autocomplete.changed(autocomplete.GROUP, instance.pk)
+    cache.group_changed(instance, getattr(instance, 'old_slug', None))
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.follow_added(instance)
+        timeline.follow(instance.user, instance.author)
+    cache.follow_changed(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.follow_removed(instance)
+    timeline.unfollow(instance.user, instance.author)
+    cache.follow_changed(instance)
@@ -0,0 +1,11 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_picture(post, geometry):
+    """Данные для <img> изображения поста: миниатюра, srcset, размеры."""
+    return thumbnails.picture(post, geometry)
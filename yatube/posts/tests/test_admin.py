@@ -0,0 +1,84 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import counts
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class AdminChangelistTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_rows(self, number):
+        start = User.objects.count()
+        for i in range(start, start + number):
+            author = User.objects.create_user(username=f'author{i}')
+            group = Group.objects.create(
+                title=f'Группа {i}', slug=f'group-{i}', description='-'
+            )
+            post = Post.objects.create(
+                text=f'Пост {i}', author=author, group=group
+            )
+            Comment.objects.create(post=post, author=author, text='Ответ')
+            Follow.objects.create(user=self.admin, author=author)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def test_changelist_queries_do_not_grow(self):
+        """Число запросов списка не зависит от числа строк."""
+        urls = [
+            reverse(f'admin:posts_{model}_changelist')
+            for model in ('post', 'comment', 'follow')
+        ]
+        self.add_rows(1)
+        before = [self.count_queries(url) for url in urls]
+        self.add_rows(3)
+        self.assertEqual([self.count_queries(url) for url in urls], before)
+
+    def test_changelist_uses_estimate(self):
+        """Для большой таблицы список показывает оценку числа строк."""
+        self.add_rows(3)
+        with self.settings(EXACT_COUNT_THRESHOLD=2), \
+                mock.patch.object(counts, 'planner_estimate',
+                                  return_value=1000000):
+            response = self.client.get(reverse('admin:posts_post_changelist'))
+        self.assertEqual(response.context['cl'].result_count, 1000000)
+        self.assertContains(response, 'selected>Группа 2</option>')
+
+    def test_comment_cannot_be_moved(self):
+        """Место сохранённого комментария в дереве не меняется в админке."""
+        self.add_rows(2)
+        first, second = Comment.objects.order_by('pk')
+        url = reverse('admin:posts_comment_change', args=[first.pk])
+        response = self.client.get(url)
+        self.assertNotIn('post', response.context['adminform'].form.fields)
+        self.assertNotIn('parent', response.context['adminform'].form.fields)
+        self.client.post(url, {
+            'post': second.post_id,
+            'parent': second.pk,
+            'author': first.author_id,
+            'text': 'Исправлено',
+        })
+        edited = Comment.objects.get(pk=first.pk)
+        self.assertEqual(edited.text, 'Исправлено')
+        self.assertEqual(
+            (edited.post_id, edited.parent_id, edited.path),
+            (first.post_id, None, first.path)
+        )
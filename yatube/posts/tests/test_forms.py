@@ -1,18 +1,36 @@
+import os
 import shutil
 import tempfile
+from datetime import timedelta
 from http import HTTPStatus
+from io import BytesIO, StringIO
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.files import File
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from core.storage import TEMP_PREFIX
 
 from posts.forms import PostForm
-from posts.models import Comment, Group, Post
+from posts.blobs import collect_garbage, image_storage
+from posts.models import Comment, Group, ImageBlob, Post
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -76,7 +94,7 @@ class PostModelTest(TestCase):
             Post.objects.filter(
                 text='Тестовый текст',
                 group=PostModelTest.group.id,
-                image='posts/small.gif'
+                image__regex=r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.gif$'
             ).exists()
         )
 
@@ -120,3 +138,196 @@ class PostModelTest(TestCase):
                 text='Тестовый комментарий для проверки',
             ).exists()
         )
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_IMAGE_MAX_SIZE=(200, 200)
+)
+class ImageIngestTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    @staticmethod
+    def upload(name, image_format, mode, size, **params):
+        content = BytesIO()
+        Image.new(mode, size).save(content, image_format, **params)
+        return SimpleUploadedFile(name=name, content=content.getvalue())
+
+    def clean_image(self, upload):
+        form = PostForm(data={'text': 'Фото'}, files={'image': upload})
+        self.assertTrue(form.is_valid(), form.errors)
+        return Image.open(form.cleaned_data['image'])
+
+    def test_large_photo_resized_without_exif(self):
+        """Фото уменьшается, а EXIF отбрасывается."""
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        image = self.clean_image(self.upload(
+            'photo.jpg', 'JPEG', 'RGB', (1000, 500), exif=exif.tobytes()
+        ))
+        self.assertEqual(image.size, (200, 100))
+        self.assertNotIn('exif', image.info)
+
+    def test_transparency_kept(self):
+        """Прозрачное изображение остаётся прозрачным."""
+        image = self.clean_image(
+            self.upload('logo.png', 'PNG', 'RGBA', (300, 300))
+        )
+        self.assertEqual(image.mode, 'RGBA')
+        self.assertEqual(image.size, (200, 200))
+
+    def test_gif_resized_with_animation(self):
+        """GIF уменьшается покадрово, без комментария и с анимацией."""
+        frames = [Image.new('P', (300, 300), color) for color in range(3)]
+        content = BytesIO()
+        frames[0].save(
+            content, 'GIF', save_all=True, append_images=frames[1:],
+            duration=[50, 60, 70], loop=0, transparency=0,
+            comment=b'secret'
+        )
+        image = self.clean_image(
+            SimpleUploadedFile(name='anim.gif', content=content.getvalue())
+        )
+        self.assertEqual(image.format, 'GIF')
+        self.assertEqual(image.size, (200, 200))
+        self.assertEqual(image.n_frames, 3)
+        self.assertEqual(image.info['loop'], 0)
+        self.assertEqual(image.info['transparency'], 0)
+        self.assertNotIn('comment', image.info)
+
+    def test_long_gif_rejected(self):
+        """GIF сверх лимита кадров или пикселей отклоняется формой."""
+        frames = [Image.new('P', (30, 30), color) for color in range(3)]
+        content = BytesIO()
+        frames[0].save(
+            content, 'GIF', save_all=True, append_images=frames[1:]
+        )
+        limits = {
+            'frames': {'POST_GIF_MAX_FRAMES': 2},
+            'pixels': {'POST_GIF_MAX_PIXELS': 2 * 30 * 30},
+        }
+        for limit, options in limits.items():
+            with self.subTest(limit=limit), self.settings(**options):
+                upload = SimpleUploadedFile(
+                    name='anim.gif', content=content.getvalue()
+                )
+                form = PostForm(
+                    data={'text': 'Фото'}, files={'image': upload}
+                )
+                self.assertFalse(form.is_valid())
+                self.assertIn('image', form.errors)
+
+    def test_broken_image_rejected(self):
+        """Обрезанный JPEG не роняет сервер, а отклоняется формой."""
+        content = self.upload('photo.jpg', 'JPEG', 'RGB', (500, 500)).read()
+        upload = SimpleUploadedFile(
+            name='photo.jpg', content=content[:len(content) // 2]
+        )
+        form = PostForm(data={'text': 'Фото'}, files={'image': upload})
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageStorageTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reposter')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, name):
+        content = BytesIO()
+        Image.new('RGB', (10, 10), 'red').save(content, 'PNG')
+        return Post.objects.create(
+            text='Мем',
+            author=self.user,
+            image=SimpleUploadedFile(name=name, content=content.getvalue()),
+        )
+
+    def blob(self, post):
+        return ImageBlob.objects.get(name=post.image.name)
+
+    def test_same_content_stored_once(self):
+        """Повторная загрузка читается раз и не пишется на диск."""
+        first = self.create_post('meme.png')
+        content = BytesIO()
+        Image.new('RGB', (10, 10), 'red').save(content, 'PNG')
+        upload = SimpleUploadedFile(
+            name='repost.png', content=content.getvalue()
+        )
+        with mock.patch.object(
+            upload, 'chunks', wraps=upload.chunks
+        ) as chunks, mock.patch.object(
+            image_storage(), 'write_temporary'
+        ) as write_temporary:
+            second = Post.objects.create(
+                text='Мем', author=self.user, image=upload
+            )
+        chunks.assert_called_once()
+        write_temporary.assert_not_called()
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(self.blob(first).refs, 2)
+        self.assertEqual(
+            os.listdir(os.path.dirname(first.image.path)),
+            [os.path.basename(first.image.name)]
+        )
+        self.assertFalse(
+            [name for name in os.listdir(TEMP_MEDIA_ROOT)
+             if name.startswith(TEMP_PREFIX)]
+        )
+
+    def test_file_needed_again_not_collected(self):
+        """Сборщик не удаляет файл, который только что загрузили снова."""
+        post = self.create_post('meme.png')
+        name = post.image.name
+        post.delete()
+        ImageBlob.objects.update(updated=timezone.now() - timedelta(days=1))
+        with open(image_storage().path(name), 'rb') as content:
+            image_storage().save('posts/again.png', File(content))
+        self.assertEqual(collect_garbage(), [])
+        self.assertTrue(image_storage().exists(name))
+        self.assertTrue(ImageBlob.objects.filter(name=name).exists())
+
+    def test_unreferenced_file_collected(self):
+        """Файл удаляется сборщиком, когда на него не осталось ссылок."""
+        first = self.create_post('meme.png')
+        second = self.create_post('repost.png')
+        name = first.image.name
+        first.delete()
+        call_command('collect_images', grace=0, stdout=StringIO())
+        self.assertTrue(image_storage().exists(name))
+        second.delete()
+        self.assertEqual(ImageBlob.objects.get(name=name).refs, 0)
+        call_command('collect_images', grace=0, stdout=StringIO())
+        self.assertFalse(image_storage().exists(name))
+        self.assertFalse(ImageBlob.objects.filter(name=name).exists())
+
+    def test_stale_upload_collected(self):
+        """Сборщик удаляет давний временный файл прерванной загрузки."""
+        storage = image_storage()
+        stale = storage.path(f'{TEMP_PREFIX}stale')
+        fresh = storage.path(f'{TEMP_PREFIX}fresh')
+        for path in (stale, fresh):
+            with open(path, 'wb') as temporary:
+                temporary.write(b'part')
+        long_ago = (timezone.now() - timedelta(hours=2)).timestamp()
+        os.utime(stale, (long_ago, long_ago))
+        self.assertEqual(collect_garbage(), [f'{TEMP_PREFIX}stale'])
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.exists(fresh))
+        os.remove(fresh)
+
+    def test_replaced_image_released(self):
+        """Замена изображения снимает ссылку со старого файла."""
+        post = self.create_post('meme.png')
+        old_name = post.image.name
+        post.image = SimpleUploadedFile(name='new.gif', content=SMALL_GIF)
+        post.save()
+        self.assertEqual(ImageBlob.objects.get(name=old_name).refs, 0)
+        self.assertEqual(self.blob(post).refs, 1)
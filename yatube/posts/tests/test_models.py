@@ -1,7 +1,14 @@
+from io import StringIO
+from unittest import skipUnless
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Q
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..models import Comment, Follow, Group, Post, UserStats
+from ..utils import COUNT_POST, KeysetPaginator
 
 User = get_user_model()
 
@@ -59,3 +66,200 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     post._meta.get_field(field).help_text, expected_value)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+class QueryPlanMixin:
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(f'INDEX {index_name}', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class FeedQueryPlanTest(QueryPlanMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            group=cls.group,
+            text='Тестовый пост',
+        )
+
+    def test_feed_queries_use_composite_indexes(self):
+        """Ленты читаются по составным индексам без сортировки в B-tree."""
+        feeds = {
+            'post_created': Post.objects.all(),
+            'post_group_created': self.group.posts.all(),
+            'post_author_created': self.user.posts.all(),
+            'comment_post_created': self.post.comments.all(),
+        }
+        for index_name, queryset in feeds.items():
+            with self.subTest(index_name=index_name):
+                paginator = KeysetPaginator(queryset, COUNT_POST)
+                self.assertUsesIndex(
+                    paginator.object_list[:COUNT_POST], index_name
+                )
+                after_post = Q(created__lt=self.post.created) | Q(
+                    created=self.post.created, pk__lt=self.post.pk
+                )
+                self.assertUsesIndex(
+                    paginator.object_list.filter(after_post)[:COUNT_POST],
+                    index_name
+                )
+
+    def test_followers_query_uses_index(self):
+        """Подписчики автора выбираются по индексу (author, user)."""
+        self.assertUsesIndex(
+            Follow.objects.filter(author=self.user).values_list(
+                'user_id', flat=True
+            ),
+            'follow_author_user'
+        )
+
+
+class CommentThreadTest(QueryPlanMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def reply(self, parent=None, post=None):
+        return Comment.objects.create(
+            post=post or self.post, author=self.user, text='Ответ',
+            parent=parent
+        )
+
+    def test_path_orders_tree_depth_first(self):
+        """Сортировка по пути даёт обход ветки в глубину."""
+        root = self.reply()
+        first = self.reply(root)
+        second = self.reply(root)
+        nested = self.reply(first)
+        self.assertEqual(nested.depth, 2)
+        self.assertEqual(
+            nested.path, root.path + first.path[-7:] + nested.path[-7:]
+        )
+        self.assertEqual(
+            list(self.post.comments.order_by('path')),
+            [root, first, nested, second]
+        )
+        root.refresh_from_db()
+        self.assertEqual(root.replies_count, 2)
+
+    def test_too_deep_reply_attached_to_parent(self):
+        """Ответ глубже MAX_DEPTH становится ответом родителю."""
+        parent = self.reply()
+        for _ in range(Comment.MAX_DEPTH):
+            parent = self.reply(parent)
+        reply = self.reply(parent)
+        self.assertEqual(reply.depth, Comment.MAX_DEPTH)
+        self.assertEqual(reply.parent_id, parent.parent_id)
+
+    def test_thread_queries_use_indexes(self):
+        """Корни и ветки обсуждения читаются по индексам."""
+        root = self.reply()
+        self.assertUsesIndex(
+            self.post.comments.filter(depth=0)[:COUNT_POST],
+            'comment_post_depth'
+        )
+        self.assertUsesIndex(
+            self.post.comments.filter(
+                path__gt=root.path, path__lt=root.path + Comment.PATH_END
+            ).order_by('path'),
+            'comment_post_path'
+        )
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.author = User.objects.create_user(username='author')
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются при создании и удалении записей."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.user, text='Ответ')
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.user).following_count, 1)
+        follow.delete()
+        post.comments.all().delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.user).following_count, 0)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+
+    def test_group_posts_count_follows_writes(self):
+        """Счётчик постов группы меняется при создании, переносе и удалении."""
+        first = Group.objects.create(title='Первая', slug='first')
+        second = Group.objects.create(title='Вторая', slug='second')
+        post = Post.objects.create(
+            author=self.author, text='Пост', group=first
+        )
+        first.refresh_from_db()
+        self.assertEqual(first.posts_count, 1)
+        first.title = 'Переименованная'
+        first.save()
+        post.group = second
+        post.save()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.posts_count, second.posts_count), (0, 1))
+        post.delete()
+        second.refresh_from_db()
+        self.assertEqual(second.posts_count, 0)
+
+    def test_post_save_keeps_comments_count(self):
+        """Сохранение поста не затирает счётчик комментариев."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.user, text='Ответ')
+        post.text = 'Исправленный пост'
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+    def test_drifted_counters_stay_non_negative(self):
+        """Разошедшийся до нуля счётчик не уходит в минус при удалении."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='Ответ'
+        )
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        UserStats.objects.update(
+            posts_count=0, followers_count=0, following_count=0
+        )
+        Post.objects.update(comments_count=0)
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.user).following_count, 0)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+
+    def test_recount_stats_fixes_drift(self):
+        """Команда recount_stats пересчитывает разошедшиеся счётчики."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.user, text='Ответ')
+        UserStats.objects.update(posts_count=42)
+        Post.objects.update(comments_count=42)
+        UserStats.objects.filter(user=self.user).delete()
+        call_command('recount_stats', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.user).posts_count, 0)
@@ -0,0 +1,183 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts import autocomplete
+from posts.models import Comment, Group, Post
+from posts.search import (SearchBackend, SQLiteSearchBackend, get_backend,
+                          match_expression, search_posts)
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader')
+        cls.about_cats = Post.objects.create(
+            text='Кошки спят шестнадцать часов в сутки', author=cls.user
+        )
+        cls.about_dogs = Post.objects.create(
+            text='Собаки любят гулять', author=cls.user
+        )
+        cls.comment = Comment.objects.create(
+            post=cls.about_dogs, author=cls.user, text='А кошки нет'
+        )
+
+    def found(self, query, **kwargs):
+        posts, _ = search_posts(query, **kwargs)
+        return [post.pk for post in posts]
+
+    def test_sqlite_backend_used(self):
+        """В SQLite поиск идёт по индексу FTS5."""
+        self.assertIsInstance(get_backend(), SQLiteSearchBackend)
+
+    def test_posts_and_comments_found(self):
+        """Пост находится по своему тексту и по тексту комментария."""
+        self.assertCountEqual(
+            self.found('кошки'), [self.about_cats.pk, self.about_dogs.pk]
+        )
+        self.assertEqual(self.found('гулять'), [self.about_dogs.pk])
+        self.assertEqual(self.found('соба'), [self.about_dogs.pk])
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при изменении и удалении записей."""
+        post = Post.objects.get(pk=self.about_cats.pk)
+        post.text = 'Попугаи говорят'
+        post.save()
+        self.assertEqual(self.found('попугаи'), [post.pk])
+        self.assertEqual(self.found('кошки'), [self.about_dogs.pk])
+        Comment.objects.filter(pk=self.comment.pk).get().delete()
+        self.assertEqual(self.found('кошки'), [])
+        post.delete()
+        self.assertEqual(self.found('попугаи'), [])
+
+    def test_keyset_pages(self):
+        """Страницы результатов идут по курсору без повторов."""
+        for number in range(5):
+            Post.objects.create(text=f'Котлеты {number}', author=self.user)
+        first, cursor = search_posts('котлеты', limit=3)
+        second, last_cursor = search_posts('котлеты', cursor, limit=3)
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 2)
+        self.assertEqual(last_cursor, '')
+        self.assertFalse({post.pk for post in first} & {
+            post.pk for post in second
+        })
+
+    def test_query_operators_escaped(self):
+        """Синтаксис FTS5 из запроса не ломает поиск."""
+        self.assertEqual(match_expression('"кошки" OR (NEAR'),
+                         '"кошки" "OR" "NEAR"*')
+        self.assertEqual(self.found('*)"'), [])
+
+    def test_fallback_backend(self):
+        """Запасной бэкенд ищет через icontains, свежие посты первыми."""
+        def found(query):
+            return [post_id for _, post_id in SearchBackend().search(query)]
+
+        self.assertEqual(found('ят'), [self.about_dogs.pk, self.about_cats.pk])
+        self.assertEqual(found('нет'), [self.about_dogs.pk])
+
+    def test_search_page(self):
+        """Страница поиска показывает найденные посты."""
+        response = self.client.get(reverse('posts:search'), {'q': 'гулять'})
+        self.assertEqual(response.context['posts'], [self.about_dogs])
+        self.assertContains(response, 'Собаки любят гулять')
+
+
+@mock.patch.object(
+    autocomplete.transaction, 'on_commit', lambda callback: callback()
+)
+@mock.patch.object(
+    autocomplete, 'in_background', lambda function: function()
+)
+class AutocompleteTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.leo = User.objects.create_user(
+            username='leo', first_name='Лев', last_name='Толстой'
+        )
+        cls.group = Group.objects.create(
+            title='Литература', slug='books', description='Книги'
+        )
+
+    def setUp(self):
+        patcher = mock.patch.object(
+            autocomplete, 'local_index', autocomplete.LocalIndex()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def suggest(self, query):
+        return [key for _, key, _ in autocomplete.suggest(query)]
+
+    def test_prefix_matches(self):
+        """Поиск по началу username, имени, фамилии, названия и slug."""
+        self.assertEqual(self.suggest('le'), ['leo'])
+        self.assertEqual(self.suggest('лев т'), ['leo'])
+        self.assertEqual(self.suggest('толс'), ['leo'])
+        self.assertEqual(self.suggest('ЛИТ'), ['books'])
+        self.assertEqual(self.suggest('boo'), ['books'])
+        self.assertEqual(self.suggest('x'), [])
+
+    def test_index_follows_changes(self):
+        """Изменения применяются к уже построенному индексу."""
+        self.suggest('le')
+        with mock.patch.object(autocomplete, 'build') as build:
+            User.objects.create_user(username='leonid')
+            self.assertEqual(self.suggest('leo'), ['leo', 'leonid'])
+            self.group.title = 'Поэзия'
+            self.group.save()
+            self.assertEqual(self.suggest('лит'), [])
+            self.assertEqual(self.suggest('поэ'), ['books'])
+            User.objects.filter(username='leonid').get().delete()
+            self.assertEqual(self.suggest('leo'), ['leo'])
+        build.assert_not_called()
+
+    def test_log_shared_between_processes(self):
+        """Журнал в базе: очистка кэша процесса не теряет события."""
+        self.suggest('le')
+        other_process = autocomplete.LocalIndex()
+        other_process.get()
+        User.objects.create_user(username='leonid')
+        cache.clear()
+        with mock.patch.object(autocomplete, 'build') as build:
+            self.assertEqual(self.suggest('leo'), ['leo', 'leonid'])
+            self.assertEqual(
+                [key for _, key, _ in other_process.get().search('leo')],
+                ['leo', 'leonid']
+            )
+        build.assert_not_called()
+
+    def test_new_generation_rebuilt_in_background(self):
+        """Новое поколение журнала перестраивает индекс вне запроса."""
+        self.suggest('le')
+        autocomplete.start_generation()
+        User.objects.create_user(username='leonid')
+        with mock.patch.object(autocomplete, 'in_background') as background:
+            self.assertEqual(self.suggest('leo'), ['leo'])
+        background.assert_called_once_with(
+            autocomplete.local_index.rebuild
+        )
+        autocomplete.local_index.building = False
+        self.assertEqual(self.suggest('leo'), ['leo', 'leonid'])
+
+    def test_login_does_not_publish(self):
+        """Вход пользователя не попадает в журнал изменений."""
+        with mock.patch.object(autocomplete, 'publish') as publish:
+            self.client.force_login(self.leo)
+        publish.assert_not_called()
+
+    def test_endpoint(self):
+        """JSON с типом, ключом, подписью и ссылкой."""
+        response = self.client.get(reverse('posts:autocomplete'), {'q': 'л'})
+        self.assertEqual(response.json()['results'], [
+            {'type': 'user', 'key': 'leo', 'label': 'Лев Толстой',
+             'url': reverse('posts:profile', kwargs={'username': 'leo'})},
+            {'type': 'group', 'key': 'books', 'label': 'Литература',
+             'url': reverse('posts:group_list', kwargs={'slug': 'books'})},
+        ])
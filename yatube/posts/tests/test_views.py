@@ -1,18 +1,45 @@
 import shutil
 import tempfile
+import time
+from io import BytesIO, StringIO
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.template.loader import render_to_string
 from django.urls import reverse
+from PIL import Image
 
-from posts.models import Follow, Group, Post
+from core import routers
+from posts import threads, thumbnails
+from posts.management.commands import thumbnail_worker
+from posts.threads import INLINE_DEPTH
+from posts.cache import (INDEX, changed_within, feed_cache_key, group_scope,
+                         version_key, versions)
+from posts.models import (Comment, FeedEntry, Follow, Group, Post,
+                          UserStats)
+from posts.utils import (COUNT_COMMENTS, COUNT_POST, ELLIPSIS,
+                         KeysetPaginator, comments_page, elided_page_range)
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
 
 
 class PostPagesTests(TestCase):
@@ -123,15 +150,92 @@ class PostPagesTests(TestCase):
             self.assertIn(self.post.text, task_page)
 
     def test_index_cache(self):
-        """Проверка работы кэша на главной странице."""
+        """Главная страница отдаётся из кэша, пока посты не изменились."""
         index_cache = reverse('posts:index')
-        response = self.authorized_client.get(index_cache)
-        Post.objects.all().delete()
-        response_2 = self.authorized_client.get(index_cache)
+        response = self.guest_client.get(index_cache)
+        response_2 = self.guest_client.get(index_cache)
+        self.assertIsNone(response_2.context)
         self.assertEqual(response.content, response_2.content)
-        cache.clear()
-        response_3 = self.authorized_client.get(index_cache)
-        self.assertNotEqual(response_2.context, response_3.context)
+        Post.objects.all().delete()
+        response_3 = self.guest_client.get(index_cache)
+        self.assertIsNotNone(response_3.context)
+        self.assertNotEqual(response.content, response_3.content)
+
+    def test_index_cache_shared_by_users(self):
+        """Вошедшие делят кэш страницы, а шапка у каждого своя."""
+        index_cache = reverse('posts:index')
+        self.authorized_client.get(index_cache)
+        author_client = Client()
+        author_client.force_login(self.author)
+        response = author_client.get(index_cache)
+        templates = [template.name for template in response.templates]
+        self.assertNotIn('posts/index.html', templates)
+        self.assertIn('includes/header.html', templates)
+        self.assertContains(response, f'Пользователь: {self.author}')
+        self.assertNotContains(response, f'Пользователь: {self.user}')
+        self.assertContains(response, 'Избранные авторы')
+        self.assertNotContains(response, '<!--hole:')
+
+    def test_profile_follow_button_per_user(self):
+        """Кнопка подписки в общей копии профиля своя у каждого."""
+        profile = reverse('posts:profile', kwargs={'username': self.author})
+        Follow.objects.create(user=self.user, author=self.author)
+        self.authorized_client.get(profile)
+        reader = User.objects.create_user(username='reader')
+        reader_client = Client()
+        reader_client.force_login(reader)
+        self.assertContains(
+            self.authorized_client.get(profile), 'Отписаться'
+        )
+        self.assertContains(reader_client.get(profile), 'Подписаться')
+
+    def test_feed_versions_bumped_on_changes(self):
+        """Изменения постов, групп и подписок меняют версии лент."""
+        group_scope = f'group:{self.group.slug}'
+        author_scope = f'author:{self.user.username}'
+        follow_scope = f'follow:{self.author.pk}'
+        before = versions('index', group_scope, author_scope, follow_scope)
+        Follow.objects.create(user=self.author, author=self.user)
+        after_follow = versions(
+            'index', group_scope, author_scope, follow_scope
+        )
+        self.assertNotEqual(before, after_follow)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Исправленный пост'
+        post.save()
+        after_edit = versions(
+            'index', group_scope, author_scope, follow_scope
+        )
+        for old, new in zip(after_follow.split('.'), after_edit.split('.')):
+            self.assertNotEqual(old, new)
+
+    def test_group_rename_bumps_old_slug(self):
+        """После смены адреса группы старые страницы группы не читаются."""
+        old_scope = f'group:{self.group.slug}'
+        before = versions(old_scope)
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'renamed'
+        group.save()
+        self.assertNotEqual(versions(old_scope), before)
+
+    def test_pages_of_user_without_stats(self):
+        """Профиль и пост пользователя без строки счётчиков открываются."""
+        post = Post.objects.create(author=self.author, text='Без счётчиков')
+        UserStats.objects.filter(user=self.author).delete()
+        pages = {
+            reverse('posts:profile', kwargs={'username': self.author}):
+                'Всего постов: 1 ',
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}):
+                '<span>1</span>',
+        }
+        for url, posts_count in pages.items():
+            with self.subTest(url=url):
+                cache.clear()
+                response = self.guest_client.get(url)
+                self.assertContains(response, posts_count)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 1
+        )
 
     def test_follower(self):
         """Работа подписки на автора поста."""
@@ -209,3 +313,644 @@ class PaginatorViewsTest(TestCase):
                 self.assertEqual(len(response.context['page_obj']), 10)
                 response_2 = self.guest_client.get(reverse_name + '?page=2')
                 self.assertEqual(len(response_2.context['page_obj']), 3)
+
+    def test_paginator_cursor(self):
+        """Переход по курсору совпадает с постраничной навигацией."""
+        url = reverse('posts:index')
+        cache.clear()
+        first_page = self.guest_client.get(url).context['page_obj']
+        cache.clear()
+        next_page = self.guest_client.get(
+            url, {'cursor': first_page.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(next_page.number, 2)
+        self.assertEqual(len(next_page), 3)
+        self.assertFalse(next_page.has_next())
+        cache.clear()
+        previous_page = self.guest_client.get(
+            url, {'cursor': next_page.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(previous_page.number, 1)
+        self.assertEqual(list(previous_page), list(first_page))
+
+    def test_index_fragment_keyed_by_cursor(self):
+        """Страница по курсору не берёт фрагмент страницы с тем же номером."""
+        url = reverse('posts:index')
+        cache.clear()
+        self.addCleanup(cache.clear)
+        cursor = self.guest_client.get(url).context['page_obj'].next_cursor
+        Post.objects.create(text='Новый пост', author=self.user)
+        numbered = self.guest_client.get(url, {'page': 2})
+        by_cursor = self.guest_client.get(url, {'cursor': cursor})
+        self.assertContains(numbered, 'Тестовый пост 3</p>')
+        self.assertNotContains(by_cursor, 'Тестовый пост 3</p>')
+        self.assertContains(by_cursor, 'Тестовый пост 2</p>')
+
+    def test_paginator_cursor_without_offset(self):
+        """Страница по курсору выбирается одним запросом без OFFSET."""
+        posts = Post.objects.all()
+        first_page = KeysetPaginator(posts, COUNT_POST).get_page(1)
+        with CaptureQueriesContext(connection) as queries:
+            page = KeysetPaginator(posts, COUNT_POST).get_page(
+                None, cursor=first_page.next_cursor
+            )
+            self.assertTrue(page.has_previous())
+            self.assertFalse(page.has_next())
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('OFFSET', queries[0]['sql'])
+        self.assertNotIn('COUNT', queries[0]['sql'])
+
+    def test_paginator_broken_cursor(self):
+        """Испорченный курсор открывает первую страницу."""
+        response = self.guest_client.get(
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            {'cursor': 'broken'}
+        )
+        self.assertEqual(response.context['page_obj'].number, 1)
+
+    def test_paginator_page_range_window(self):
+        """В навигации только окно страниц вокруг текущей и края ленты."""
+        page = KeysetPaginator(Post.objects.all(), 1).get_page(7)
+        self.assertEqual(
+            list(elided_page_range(page)),
+            [1, ELLIPSIS, 5, 6, 7, 8, 9, ELLIPSIS, 13]
+        )
+
+    def test_paginator_large_profile_uses_counter(self):
+        """Большая лента автора считается по счётчику постов, без COUNT."""
+        UserStats.objects.filter(user=self.user).update(posts_count=1000)
+        cache.clear()
+        with self.settings(EXACT_COUNT_THRESHOLD=5), \
+                CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(
+                reverse('posts:profile', kwargs={'username': self.user})
+            )
+        page = response.context['page_obj']
+        self.assertEqual(page.paginator.count, 1000)
+        self.assertEqual(page.paginator.num_pages, 100)
+        for query in queries.captured_queries:
+            self.assertNotIn('SELECT COUNT(*) AS', query['sql'])
+
+    def test_paginator_large_feeds_use_counters(self):
+        """Большие ленты группы и подписок считаются по счётчикам."""
+        reader = User.objects.create_user(username='counter_reader')
+        Follow.objects.create(user=reader, author=self.user)
+        client = Client()
+        client.force_login(reader)
+        Group.objects.filter(pk=self.group.pk).update(posts_count=1000)
+        UserStats.objects.filter(user=self.user).update(posts_count=1000)
+        cache.clear()
+        urls = [
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:follow_index'),
+        ]
+        for url in urls:
+            with self.subTest(url=url), self.settings(
+                EXACT_COUNT_THRESHOLD=5
+            ), CaptureQueriesContext(connection) as queries:
+                response = client.get(url)
+            self.assertEqual(response.context['page_obj'].paginator.count,
+                             1000)
+            for query in queries.captured_queries:
+                self.assertNotIn('SELECT COUNT(*) AS', query['sql'])
+
+
+class FollowTimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def follow_page(self):
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_new_post_fanned_out_to_followers(self):
+        """Новый пост автора попадает в ленту подписчика."""
+        post = Post.objects.create(text='Пост для ленты', author=self.author)
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.user, post=post).exists()
+        )
+        self.assertEqual(self.follow_page(), [post])
+
+    def test_follow_backfills_and_unfollow_clears_timeline(self):
+        """Подписка переносит старые посты, отписка убирает их."""
+        other = User.objects.create_user(username='other_writer')
+        post = Post.objects.create(text='Старый пост', author=other)
+        Follow.objects.create(user=self.user, author=other)
+        self.assertEqual(self.follow_page(), [post])
+        Follow.objects.filter(user=self.user, author=other).delete()
+        self.assertEqual(self.follow_page(), [])
+
+    def make_celebrity(self):
+        with self.settings(TIMELINE_FANOUT_LIMIT=0):
+            fan = User.objects.create_user(username='fan')
+            Follow.objects.create(user=fan, author=self.author)
+        return fan
+
+    def test_celebrity_posts_read_on_request(self):
+        """Посты автора с множеством подписчиков подмешиваются при чтении."""
+        self.make_celebrity()
+        post = Post.objects.create(
+            text='Пост знаменитости', author=self.author
+        )
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        self.assertEqual(self.follow_page(), [post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2, TIMELINE_FANOUT_MARGIN=0)
+    def test_push_feeds_restores_fan_out(self):
+        """Команда push_feeds раскладывает посты автора обратно по лентам."""
+        fan = self.make_celebrity()
+        post = Post.objects.create(
+            text='Пост знаменитости', author=self.author
+        )
+        Follow.objects.filter(user=fan, author=self.author).delete()
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        call_command('push_feeds', stdout=StringIO())
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.user, post=post).exists()
+        )
+        self.assertFalse(FeedEntry.objects.filter(user=fan).exists())
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.user, post=new_post).exists()
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2, TIMELINE_FANOUT_MARGIN=1)
+    def test_push_feeds_waits_for_margin(self):
+        """Автор у порога продолжает подмешиваться при чтении."""
+        fan = self.make_celebrity()
+        Follow.objects.filter(user=fan, author=self.author).delete()
+        call_command('push_feeds', stdout=StringIO())
+        self.assertTrue(UserStats.objects.get(user=self.author).feed_pulled)
+        post = Post.objects.create(
+            text='Пост знаменитости', author=self.author
+        )
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        self.assertEqual(self.follow_page(), [post])
+
+
+class FeedQueryBudgetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        for i in range(COUNT_POST):
+            author = User.objects.create_user(username=f'author_{i}')
+            Follow.objects.create(user=cls.user, author=author)
+            Post.objects.create(
+                text=f'Пост {i}',
+                author=author,
+                group=Group.objects.create(title=f'Группа {i}', slug=f'g{i}'),
+            )
+        Post.objects.bulk_create(
+            Post(text=f'Пост группы {i}', author=cls.user, group=cls.group)
+            for i in range(COUNT_POST)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_feed_query_budget(self):
+        """Число запросов ленты не зависит от числа постов на странице."""
+        feeds = {
+            reverse('posts:index'): (self.guest_client, 2),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}):
+            (self.guest_client, 3),
+            reverse('posts:profile', kwargs={'username': self.user}):
+            (self.guest_client, 3),
+            reverse('posts:follow_index'): (self.authorized_client, 5),
+        }
+        for url, (client, budget) in feeds.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(budget):
+                    response = client.get(url)
+                self.assertEqual(
+                    len(response.context['page_obj']), COUNT_POST
+                )
+
+
+class CacheFeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        Post.objects.create(text='Тестовый пост', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        request = RequestFactory().get(reverse('posts:index'))
+        request.user = AnonymousUser()
+        self.key = feed_cache_key(request, [INDEX])
+        cache.set(self.key, (time.time() - 1, HttpResponse('stale')), 60)
+
+    def test_stale_page_served_while_regenerating(self):
+        """Пока страницу строит другой запрос, отдаётся старая копия."""
+        cache.add(f'{self.key}:lock', True)
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertEqual(response.content, b'stale')
+
+    def test_foreign_lock_kept(self):
+        """Не дождавшийся страницы запрос не снимает чужую блокировку."""
+        cache.delete(self.key)
+        cache.add(f'{self.key}:lock', True)
+        with mock.patch('posts.cache.wait_for_entry', return_value=None):
+            response = self.guest_client.get(reverse('posts:index'))
+        self.assertIsNotNone(response.context)
+        self.assertTrue(cache.get(f'{self.key}:lock'))
+
+    def test_expired_page_regenerated(self):
+        """Устаревшую копию пересчитывает запрос, захвативший блокировку."""
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertIsNotNone(response.context)
+        self.assertIsNone(cache.get(f'{self.key}:lock'))
+        fresh_until, cached = cache.get(self.key)
+        self.assertGreater(fresh_until, time.time())
+        self.assertEqual(cached.content, response.content)
+
+    def test_fresh_feed_read_from_primary(self):
+        """Недавно изменённая лента строится по основной базе."""
+        version = versions(INDEX)
+        self.assertTrue(changed_within(version, 5))
+        with mock.patch('time.time', return_value=time.time() + 10):
+            self.assertFalse(changed_within(version, 5))
+        with mock.patch.object(routers, 'use_primary',
+                               wraps=routers.use_primary) as use_primary:
+            self.guest_client.get(reverse('posts:index'))
+        use_primary.assert_called_with(True)
+
+    def test_non_ascii_scope_versioned(self):
+        """Ключ версии ленты со слагом не в ASCII годится для memcached."""
+        self.assertTrue(version_key(group_scope('группа')).isascii())
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='etag_author')
+        cls.reader = User.objects.create_user(username='etag_reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='etag-group', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.user, group=cls.group
+        )
+        cls.urls = {
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.id}): 1,
+            reverse('posts:profile', kwargs={'username': 'etag_author'}): 0,
+            reverse('posts:group_list', kwargs={'slug': 'etag-group'}): 0,
+        }
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def etags(self, client):
+        return {url: client.get(url)['ETag'] for url in self.urls}
+
+    def test_unchanged_page_not_modified(self):
+        """Совпавший ETag даёт 304 без основных запросов и шаблона."""
+        for url, etag in self.etags(self.guest_client).items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(self.urls[url]):
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag
+                    )
+                self.assertEqual(response.status_code, 304)
+                self.assertIsNone(response.context)
+
+    def test_changes_invalidate_etag(self):
+        """ETag меняется после комментария, нового поста и входа."""
+        before = self.etags(self.guest_client)
+        Comment.objects.create(post=self.post, author=self.reader, text='!')
+        after_comment = self.etags(self.guest_client)
+        post_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.id}
+        )
+        self.assertNotEqual(after_comment[post_url], before[post_url])
+        Post.objects.create(text='Ещё', author=self.user, group=self.group)
+        after_post = self.etags(self.guest_client)
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertNotEqual(after_post[url], after_comment[url])
+        self.guest_client.force_login(self.reader)
+        for url, etag in after_post.items():
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, 200)
+
+
+class CommentsPageTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='commented')
+        cls.post = Post.objects.create(
+            text='Обсуждаемый пост', author=cls.author
+        )
+        for i in range(COUNT_COMMENTS + 5):
+            Comment.objects.create(
+                post=cls.post,
+                author=User.objects.create_user(username=f'reader{i}'),
+                text=f'Комментарий {i}'
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_detail_shows_first_comments(self):
+        """На странице поста только первая порция новых комментариев."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COUNT_COMMENTS)
+        self.assertEqual(
+            comments[0].text, f'Комментарий {COUNT_COMMENTS + 4}'
+        )
+        self.assertTrue(response.context['comments_cursor'])
+        self.assertContains(response, 'data-fragment=')
+
+    def test_fragment_continues_from_cursor(self):
+        """Фрагмент продолжает список с курсора, авторы — одним запросом."""
+        first, cursor = comments_page(self.post)
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.id})
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'cursor': cursor})
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        rest = response.context['comments']
+        self.assertEqual(len(rest), 5)
+        self.assertFalse(set(first) & set(rest))
+        self.assertEqual(response.context['comments_cursor'], '')
+        self.assertNotContains(response, 'Показать ещё')
+
+    def test_broken_cursor_shows_newest(self):
+        """Испорченный курсор открывает новые комментарии."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+            {'cursor': 'broken'}
+        )
+        self.assertEqual(len(response.context['comments']), COUNT_COMMENTS)
+
+
+class ThreadedCommentsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='thread_author')
+        cls.post = Post.objects.create(text='Пост с ветками', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def reply(self, parent=None, text='Ответ'):
+        return Comment.objects.create(
+            post=self.post, author=self.user, text=text, parent=parent
+        )
+
+    def chain(self, length, parent=None):
+        for i in range(length):
+            parent = self.reply(parent, f'Уровень {i}')
+        return parent
+
+    def detail_queries(self):
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, len(queries)
+
+    def test_discussion_queries_do_not_depend_on_depth(self):
+        """Число запросов страницы поста не зависит от глубины веток."""
+        self.chain(3)
+        _, shallow = self.detail_queries()
+        self.chain(12)
+        self.chain(5, self.post.comments.filter(depth=2).first())
+        _, deep = self.detail_queries()
+        self.assertEqual(deep, shallow)
+
+    def test_deep_replies_loaded_by_fragment(self):
+        """Ответы глубже INLINE_DEPTH догружаются фрагментом."""
+        last = self.chain(INLINE_DEPTH * 2 + 2)
+        response, _ = self.detail_queries()
+        self.assertContains(response, f'Уровень {INLINE_DEPTH}')
+        self.assertNotContains(response, f'Уровень {INLINE_DEPTH + 1}')
+        hidden = Comment.objects.get(depth=INLINE_DEPTH)
+        response = self.client.get(reverse('posts:comment_replies', kwargs={
+            'post_id': self.post.id, 'comment_id': hidden.id
+        }))
+        self.assertTemplateUsed(response, 'posts/includes/reply_list.html')
+        self.assertContains(response, f'Уровень {INLINE_DEPTH + 2}')
+        self.assertNotContains(response, f'id="comment-{last.id}"')
+
+    def test_fragment_continues_after_loaded_replies(self):
+        """Фрагмент продолжает ответы с последней показанной ветки."""
+        root = self.reply()
+        replies = [self.reply(root, f'Ответ {i}') for i in range(5)]
+        self.reply(replies[1], 'Вложенный')
+        with mock.patch.object(threads, 'REPLIES_LIMIT', 3):
+            roots, _ = threads.discussion(self.post)
+            shown = roots[0].loaded_replies
+            self.assertEqual(shown, replies[:2])
+            self.assertTrue(roots[0].has_more)
+            root.refresh_from_db()
+            parent = threads.replies(root, roots[0].more_after)
+        self.assertEqual(parent.loaded_replies, replies[2:5])
+        self.assertFalse(parent.has_more)
+
+    def test_reply_only_to_same_post(self):
+        """Ответить можно только на комментарий того же поста."""
+        other = Post.objects.create(text='Другой пост', author=self.user)
+        foreign = Comment.objects.create(
+            post=other, author=self.user, text='Чужой'
+        )
+        own = self.reply()
+        url = reverse('posts:add_comment', kwargs={'post_id': self.post.id})
+        self.client.post(url, {'text': 'Ответ на чужой', 'parent': foreign.id})
+        self.client.post(url, {'text': 'Ответ на свой', 'parent': own.id})
+        self.assertFalse(Comment.objects.filter(text='Ответ на чужой'))
+        self.assertEqual(
+            Comment.objects.get(text='Ответ на свой').parent, own
+        )
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='card_author', first_name='Лев', last_name='Толстой'
+        )
+        cls.group = Group.objects.create(title='Группа', slug='card-group')
+        cls.post = Post.objects.create(
+            text='Карточка', author=cls.author, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def render_card(self):
+        post = Post.objects.select_related('author', 'group').get(
+            pk=self.post.pk
+        )
+        return render_to_string(
+            'posts/includes/post_card.html', {'post': post},
+            request=RequestFactory().get('/')
+        )
+
+    def test_card_reused_until_post_changes(self):
+        """Карточка берётся из кэша, пока пост не изменён."""
+        self.assertIn('Карточка', self.render_card())
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
+        self.assertIn('Карточка', self.render_card())
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Исправлено'
+        post.save()
+        self.assertIn('Исправлено', self.render_card())
+
+    def test_card_invalidated_by_author_and_group(self):
+        """Имя автора и группа входят в ключ карточки."""
+        self.render_card()
+        User.objects.filter(pk=self.author.pk).update(first_name='Алексей')
+        self.assertIn('Алексей Толстой', self.render_card())
+        Group.objects.filter(pk=self.group.pk).update(slug='new-slug')
+        self.assertIn('/group/new-slug/', self.render_card())
+
+    def test_card_shared_between_feeds(self):
+        """Карточка, отрисованная на главной, не рисуется в группе заново."""
+        self.client.get(reverse('posts:index'))
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        )
+        self.assertContains(response, 'Карточка')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='photographer')
+        cls.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=cls.author,
+            image=SimpleUploadedFile(
+                name='small.gif',
+                content=SMALL_GIF,
+                content_type='image/gif'
+            ),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_placeholder_until_thumbnail_ready(self):
+        """Страница не строит миниатюру свежего поста сама."""
+        with mock.patch.object(thumbnails.backend, 'get_thumbnail') as build:
+            response = self.client.get(reverse('posts:index'))
+        build.assert_not_called()
+        self.assertContains(response, 'bg-light')
+        self.assertNotContains(response, 'loading="lazy"')
+
+    def test_worker_builds_thumbnails(self):
+        """Воркер строит миниатюры, после чего шаблон их показывает."""
+        call_command(
+            'thumbnail_worker', once=True, workers=1, stdout=StringIO()
+        )
+        thumbnail = thumbnails.lookup(self.post, '960x339')
+        self.assertIsNotNone(thumbnail)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, thumbnail.url)
+
+    def test_worker_rescans_with_overlap(self):
+        """Воркер не теряет пост, изменённый в момент прошлого прохода."""
+        command = thumbnail_worker.Command()
+        _, posts = command.changed_since(self.post.updated)
+        self.assertIn(self.post, posts)
+        call_command(
+            'thumbnail_worker', once=True, workers=1, stdout=StringIO()
+        )
+        with mock.patch.object(
+            thumbnail_worker.cache, 'post_changed'
+        ) as post_changed:
+            thumbnail_worker.build(self.post)
+        post_changed.assert_not_called()
+
+    def test_worker_refreshes_cached_pages(self):
+        """После воркера закэшированные страницы показывают миниатюру."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': 'photographer'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        ]
+        etags = {url: self.client.get(url).get('ETag') for url in urls}
+        call_command(
+            'thumbnail_worker', once=True, workers=1, stdout=StringIO()
+        )
+        thumbnail = thumbnails.lookup(self.post, '960x339')
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url] or ''
+                )
+                self.assertContains(response, thumbnail.url)
+
+    def test_dimensions_stored_on_upload(self):
+        """Размеры и заглушка изображения сохраняются вместе с постом."""
+        self.assertEqual(
+            (self.post.image_width, self.post.image_height), (1, 1)
+        )
+        self.assertTrue(
+            self.post.image_placeholder.startswith('data:image/jpeg;base64,')
+        )
+
+    def test_srcset_without_filesystem(self):
+        """srcset собирается из готовых миниатюр, файлы не открываются."""
+        content = BytesIO()
+        Image.new('RGB', (1000, 400)).save(content, 'PNG')
+        post = Post.objects.create(
+            text='Широкая картинка',
+            author=self.author,
+            image=SimpleUploadedFile('wide.png', content.getvalue()),
+        )
+        call_command(
+            'thumbnail_worker', once=True, workers=1, stdout=StringIO()
+        )
+        with mock.patch.object(
+            FileSystemStorage, 'open', side_effect=AssertionError
+        ), mock.patch.object(
+            FileSystemStorage, 'exists', side_effect=AssertionError
+        ):
+            response = self.client.get(
+                reverse('posts:post_detail', kwargs={'post_id': post.pk})
+            )
+        self.assertContains(response, '480w')
+        self.assertContains(response, '960w')
+        self.assertNotContains(response, '1920w')
+        self.assertContains(response, 'width="960"')
+        self.assertContains(response, 'height="339"')
+        self.assertContains(response, post.image_placeholder)
+
+    def test_missing_thumbnail_built_after_lag(self):
+        """Если воркер отстал, миниатюра строится при отрисовке."""
+        Post.objects.filter(pk=self.post.pk).update(
+            updated=self.post.updated - thumbnails.worker_lag() * 2
+        )
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'loading="lazy"')
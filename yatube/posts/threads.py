@@ -0,0 +1,89 @@
+"""Ветки комментариев.
+
+Обсуждение поста читается двумя запросами при любой глубине дерева:
+страница корневых комментариев (utils.comments_page) и их ответы до
+INLINE_DEPTH уровней одним запросом по диапазонам материализованного
+пути (Comment.path), не больше REPLIES_LIMIT строк. Ответы, которые
+не поместились, догружаются фрагментом comment_replies.
+"""
+from django.db.models import Q
+
+from .models import Comment
+from .utils import comments_page
+
+INLINE_DEPTH: int = 3
+REPLIES_LIMIT: int = 100
+
+
+def subtree(comment, after=''):
+    """Условие на ответы comment, идущие в дереве после ветки after."""
+    end = comment.path + Comment.PATH_END
+    if after.startswith(comment.path) and after > comment.path:
+        return Q(path__gt=after + Comment.PATH_END, path__lt=end)
+    return Q(path__gt=comment.path, path__lt=end)
+
+
+def load_replies(post_id, parents, after=''):
+    """Ответы на parents в порядке обхода дерева, одним запросом.
+
+    Возвращает строки и признак того, что дальше по дереву есть ещё.
+    """
+    parents = [parent for parent in parents if parent.replies_count]
+    if not parents:
+        return [], False
+    condition = Q()
+    for parent in parents:
+        condition |= subtree(parent, after)
+    depth = max(parent.depth for parent in parents) + INLINE_DEPTH
+    rows = list(Comment.objects.filter(
+        condition, post_id=post_id, depth__lte=depth
+    ).select_related('author').order_by('path')[:REPLIES_LIMIT + 1])
+    return rows[:REPLIES_LIMIT], len(rows) > REPLIES_LIMIT
+
+
+def attach(parents, rows):
+    """Раскладывает ответы по родителям и отмечает недогруженные.
+
+    Строки идут по path, поэтому предки каждой строки уже разложены.
+    У комментария, чьи ответы загружены не все, more_after — путь
+    последнего загруженного ответа: с него продолжит фрагмент.
+    """
+    nodes = {parent.pk: parent for parent in parents}
+    for node in (*parents, *rows):
+        node.loaded_replies = []
+    for row in rows:
+        parent = nodes.get(row.parent_id)
+        if parent is not None:
+            parent.loaded_replies.append(row)
+            nodes[row.pk] = row
+    for node in nodes.values():
+        loaded = node.loaded_replies
+        node.has_more = len(loaded) < node.replies_count
+        node.more_after = loaded[-1].path if loaded else ''
+
+
+def reply_target(post, comment_id):
+    """Комментарий поста, на который отвечают, или None."""
+    if not comment_id or not str(comment_id).isdigit():
+        return None
+    return post.comments.select_related('author').filter(
+        pk=comment_id
+    ).first()
+
+
+def discussion(post, cursor=None):
+    """Корневые комментарии страницы с ветками и курсор следующей."""
+    roots, next_cursor = comments_page(post, cursor)
+    rows, _ = load_replies(post.pk, roots)
+    attach(roots, rows)
+    return roots, next_cursor
+
+
+def replies(comment, after=''):
+    """Следующая порция ответов на comment после ветки after."""
+    rows, truncated = load_replies(comment.post_id, [comment], after)
+    attach([comment], rows)
+    if after:
+        # Часть ответов уже показана, поэтому replies_count не подходит.
+        comment.has_more = truncated
+    return comment
@@ -0,0 +1,108 @@
+"""Миниатюры изображений постов.
+
+Миниатюры всех размеров из POST_THUMBNAILS строит отдельный процесс
+(python manage.py thumbnail_worker) пулом потоков: он забирает посты,
+изменённые после его последнего прохода, с запасом THUMBNAIL_WORKER_LAG
+на одинаковое время изменения и поздние коммиты. Шаблоны только ищут готовую
+миниатюру в key-value хранилище sorl-thumbnail и, пока её нет,
+показывают заглушку. Если миниатюры нет дольше THUMBNAIL_WORKER_LAG
+секунд (воркер не запущен или отстал), она строится при отрисовке.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.parsers import parse_geometry
+
+
+class LookupBackend(ThumbnailBackend):
+    def lookup(self, file_, geometry_string, **options):
+        """Готовая миниатюра из key-value хранилища или None.
+
+        Имя миниатюры вычисляется так же, как в get_thumbnail, но сама
+        миниатюра не строится и файл не открывается.
+        """
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+backend = LookupBackend()
+
+
+def worker_lag():
+    return timedelta(seconds=settings.THUMBNAIL_WORKER_LAG)
+
+
+def useful(post, geometry):
+    """Миниатюра основного размера или не шире исходного изображения."""
+    return geometry in settings.POST_IMAGE_SRCSET or not post.image_width or (
+        parse_geometry(geometry)[0] <= post.image_width
+    )
+
+
+def generate(post):
+    """Строит недостающие миниатюры; True, если построена хоть одна."""
+    built = False
+    for geometry, options in settings.POST_THUMBNAILS.items():
+        if useful(post, geometry) and not ready(post, geometry):
+            backend.get_thumbnail(post.image, geometry, **options)
+            built = True
+    return built
+
+
+def ready(post, geometry):
+    return backend.lookup(
+        post.image, geometry, **settings.POST_THUMBNAILS[geometry]
+    )
+
+
+def lookup(post, geometry):
+    """Готовая миниатюра изображения поста или None, пока её строят."""
+    if not post.image:
+        return None
+    thumbnail = ready(post, geometry)
+    if thumbnail is None and timezone.now() - post.updated > worker_lag():
+        thumbnail = backend.get_thumbnail(
+            post.image, geometry, **settings.POST_THUMBNAILS[geometry]
+        )
+    return thumbnail
+
+
+def srcset(post, geometry):
+    """srcset из готовых миниатюр не шире исходного изображения."""
+    candidates = []
+    for size in settings.POST_IMAGE_SRCSET.get(geometry, ()):
+        thumbnail = useful(post, size) and ready(post, size)
+        if thumbnail:
+            candidates.append(f'{thumbnail.url} {parse_geometry(size)[0]}w')
+    return ', '.join(candidates)
+
+
+def picture(post, geometry):
+    """Всё для тега <img>: миниатюра, srcset, размеры и заглушка.
+
+    Размеры берутся из геометрии и полей поста, файлы не открываются.
+    """
+    width, height = parse_geometry(geometry)
+    image = lookup(post, geometry)
+    return {
+        'image': image,
+        'srcset': srcset(post, geometry) if image else '',
+        'width': width,
+        'height': height,
+        'placeholder': post.image_placeholder,
+    }
@@ -0,0 +1,157 @@
+"""Материализованные ленты подписок.
+
+Новый пост раскладывается по лентам подписчиков при записи (fan-out on
+write). Когда у автора становится больше TIMELINE_FANOUT_LIMIT
+подписчиков, его посты перестают раскладываться и подмешиваются при
+чтении (UserStats.feed_pulled).
+
+Обратно автор возвращается, только когда подписчиков становится меньше
+TIMELINE_FANOUT_LIMIT - TIMELINE_FANOUT_MARGIN, чтобы колебания около
+порога не запускали перенос снова и снова. Перенос постов в ленты всех
+подписчиков делает команда push_feeds, а не запрос отписки.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import FeedEntry, Follow, Post, User, UserStats
+from .utils import KeysetPaginator, TimelinePaginator
+
+BATCH_SIZE: int = 500
+# Посты, сохранённые во время переноса, переносятся ещё раз с таким
+# запасом по времени создания.
+PUSH_OVERLAP = timedelta(minutes=1)
+
+
+def is_celebrity(author):
+    return UserStats.objects.filter(user=author, feed_pulled=True).exists()
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты подписчиков автора."""
+    if is_celebrity(post.author):
+        return
+    followers = Follow.objects.filter(
+        author=post.author
+    ).values_list('user_id', flat=True)
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(
+            user_id=user_id,
+            post=post,
+            author_id=post.author_id,
+            created=post.created,
+        ) for user_id in followers.iterator()),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id, since=None):
+    """Переносит в ленту читателя посты автора, созданные с since."""
+    posts = Post.objects.filter(author_id=author_id)
+    if since is not None:
+        posts = posts.filter(created__gte=since)
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            created=created,
+        ) for post_id, created in posts.values_list(
+            'id', 'created'
+        ).iterator()),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def follow(user, author):
+    stats = UserStats.objects.filter(user=author).values_list(
+        'followers_count', 'feed_pulled'
+    ).first()
+    count, pulled = stats or (0, False)
+    if pulled:
+        return
+    if count > settings.TIMELINE_FANOUT_LIMIT:
+        UserStats.objects.filter(user=author).update(feed_pulled=True)
+        return
+    backfill(user.pk, author.pk)
+
+
+def unfollow(user, author):
+    FeedEntry.objects.filter(user=user, author=author).delete()
+
+
+def authors_to_push():
+    """Авторы, чьи посты пора снова раскладывать по лентам."""
+    return UserStats.objects.filter(
+        feed_pulled=True,
+        followers_count__lt=(
+            settings.TIMELINE_FANOUT_LIMIT - settings.TIMELINE_FANOUT_MARGIN
+        ),
+    ).values_list('user_id', flat=True)
+
+
+def followers_of(author_id):
+    return list(Follow.objects.filter(author_id=author_id).values_list(
+        'user_id', flat=True
+    ))
+
+
+def push_feed(author_id):
+    """Раскладывает посты автора по лентам подписчиков.
+
+    Ленты заполняются по одному подписчику, после чего посты автора
+    снова раскладываются при записи. Возвращает id подписчиков.
+    """
+    started = timezone.now()
+    followers = followers_of(author_id)
+    for user_id in followers:
+        backfill(user_id, author_id)
+    UserStats.objects.filter(user_id=author_id).update(feed_pulled=False)
+    # Подписавшиеся во время переноса не получили постов при подписке,
+    # а посты, написанные во время переноса, не разложены.
+    current = followers_of(author_id)
+    for user_id in current:
+        since = None if user_id not in followers else started - PUSH_OVERLAP
+        backfill(user_id, author_id, since)
+    # Отписавшимся во время переноса записи могли добавиться заново.
+    FeedEntry.objects.filter(author_id=author_id).exclude(
+        user_id__in=Follow.objects.filter(author_id=author_id).values('user')
+    ).delete()
+    return current
+
+
+def celebrities_followed_by(user):
+    """Пары (id, username) «знаменитостей», на которых подписан user.
+
+    Результат запоминается на объекте пользователя: за один запрос его
+    спрашивают и ключ кэша ленты, и сама лента.
+    """
+    if not hasattr(user, '_followed_celebrities'):
+        user._followed_celebrities = list(User.objects.filter(
+            following__user=user,
+            stats__feed_pulled=True,
+        ).values_list('id', 'username'))
+    return user._followed_celebrities
+
+
+def follow_feed(user):
+    """Лента подписок пользователя и класс паджинатора для неё.
+
+    Если пользователь не подписан на «знаменитостей», лента читается
+    одним проходом по индексу FeedEntry (user, -created, -id).
+    """
+    celebrities = [pk for pk, _ in celebrities_followed_by(user)]
+    if not celebrities:
+        entries = FeedEntry.objects.filter(user=user).select_related(
+            'post__author', 'post__group'
+        )
+        return entries, TimelinePaginator
+    posts = Post.objects.filter(
+        Q(pk__in=FeedEntry.objects.filter(user=user).values('post'))
+        | Q(author__in=celebrities)
+    ).select_related('author', 'group')
+    return posts, KeysetPaginator
@@ -1,9 +1,222 @@
-from django.core.paginator import Paginator
+from django.core.paginator import EmptyPage, InvalidPage, Page
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from core.paginator import EstimatedCountPaginator
 
 COUNT_POST: int = 10
+COUNT_COMMENTS: int = 20
+KEYSET_ORDERING = ('-created', '-id')
+NEXT, PREVIOUS = 'n', 'p'
+PAGES_ON_EACH_SIDE: int = 2
+PAGES_ON_ENDS: int = 1
+ELLIPSIS = '…'
+
+
+def encode_cursor(number, direction, obj):
+    """Упаковывает номер страницы и ключ (created, id) в токен."""
+    raw = f'{number}|{direction}|{obj.created.isoformat()}|{obj.pk}'
+    return urlsafe_base64_encode(force_bytes(raw))
+
+
+def decode_cursor(cursor):
+    """Распаковывает токен курсора, ValueError для испорченного токена."""
+    try:
+        raw = force_str(urlsafe_base64_decode(cursor))
+        number, direction, created, pk = raw.split('|')
+        created = parse_datetime(created)
+    except (TypeError, UnicodeDecodeError):
+        raise ValueError('Некорректный курсор')
+    if direction not in (NEXT, PREVIOUS) or created is None:
+        raise ValueError('Некорректный курсор')
+    return int(number), direction, created, int(pk)
+
+
+def encode_key(created, pk):
+    """Упаковывает ключ (created, id) в токен курсора."""
+    raw = f'{created.isoformat()}|{pk}'
+    return urlsafe_base64_encode(force_bytes(raw))
+
+
+def decode_key(cursor):
+    """Распаковывает ключ (created, id), ValueError для испорченного."""
+    try:
+        created, pk = force_str(urlsafe_base64_decode(cursor)).split('|')
+        created = parse_datetime(created)
+    except (TypeError, UnicodeDecodeError):
+        raise ValueError('Некорректный курсор')
+    if created is None:
+        raise ValueError('Некорректный курсор')
+    return created, int(pk)
+
+
+def comments_page(post, cursor=None, limit=COUNT_COMMENTS):
+    """Корневые комментарии поста от новых к старым и курсор дальше.
+
+    Порция выбирается по индексу (post, depth, -created, -id) условием
+    по ключу, авторы загружаются тем же запросом.
+    """
+    comments = post.comments.filter(depth=0).select_related(
+        'author'
+    ).order_by(*KEYSET_ORDERING)
+    if cursor:
+        try:
+            created, pk = decode_key(cursor)
+        except ValueError:
+            pass
+        else:
+            comments = comments.filter(
+                Q(created__lt=created) | Q(created=created, pk__lt=pk)
+            )
+    rows = list(comments[:limit + 1])
+    next_cursor = ''
+    if len(rows) > limit:
+        next_cursor = encode_key(rows[limit - 1].created, rows[limit - 1].pk)
+    return rows[:limit], next_cursor
+
+
+class CursorPage(Page):
+    """Страница, соседи которой известны из самой выборки."""
+
+    def __init__(self, object_list, number, paginator, has_next,
+                 has_previous):
+        super().__init__(object_list, number, paginator)
+        self._has_next, self._has_previous = has_next, has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+
+class KeysetPaginator(EstimatedCountPaginator):
+    """Паджинатор по ключу (created, id).
+
+    Соседние страницы выбираются условием по ключу вместо OFFSET,
+    поэтому переход «вперёд/назад» не зависит от глубины ленты и не
+    считает посты. Число постов нужно только страницам по номеру — для
+    окна номеров в шаблоне; в большой ленте оно оценивается
+    (core.counts), а не считается.
+    """
+    ELLIPSIS = ELLIPSIS
+
+    def __init__(self, object_list, per_page, **kwargs):
+        super().__init__(
+            object_list.order_by(*KEYSET_ORDERING), per_page, **kwargs
+        )
+
+    def get_page(self, number, cursor=None):
+        if cursor:
+            try:
+                return self.cursor_page(cursor)
+            except (InvalidPage, ValueError):
+                pass
+        return super().get_page(number)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        if number > 1 and number == self.num_pages:
+            # Последнюю страницу читаем с хвоста, без OFFSET. Если число
+            # постов оценено, в ней может оказаться до per_page постов.
+            tail = min(self.count - bottom, self.per_page)
+            rows = self.object_list.reverse()[:tail]
+            return self.build_page(list(rows)[::-1], number)
+        rows = self.object_list[bottom:bottom + self.per_page]
+        return self.build_page(list(rows), number)
+
+    def cursor_page(self, cursor):
+        """Соседняя страница по курсору без COUNT(*) и OFFSET.
+
+        Выбирается на одну строку больше: по ней видно, есть ли страница
+        дальше в направлении перехода. Номер страницы из курсора только
+        подписывает её и не проверяется по числу постов.
+        """
+        number, direction, created, pk = decode_cursor(cursor)
+        if direction == NEXT:
+            rows = list(self.object_list.filter(
+                Q(created__lt=created) | Q(created=created, pk__lt=pk)
+            )[:self.per_page + 1])
+        else:
+            rows = list(self.object_list.filter(
+                Q(created__gt=created) | Q(created=created, pk__gt=pk)
+            ).reverse()[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not rows:
+            raise EmptyPage('Страница пуста')
+        if direction == NEXT:
+            has_next, has_previous = more, True
+        else:
+            rows.reverse()
+            has_next, has_previous = True, more
+        number = max(number, 2) if has_previous else 1
+        page = CursorPage(
+            self.rows_to_objects(rows), number, self, has_next, has_previous
+        )
+        return self.add_cursors(page, rows)
+
+    def build_page(self, rows, number):
+        page = self._get_page(self.rows_to_objects(rows), number, self)
+        return self.add_cursors(page, rows)
+
+    def add_cursors(self, page, rows):
+        page.next_cursor = page.previous_cursor = None
+        if rows and page.has_next():
+            page.next_cursor = encode_cursor(
+                page.number + 1, NEXT, rows[-1]
+            )
+        if rows and page.has_previous():
+            page.previous_cursor = encode_cursor(
+                page.number - 1, PREVIOUS, rows[0]
+            )
+        return page
+
+    def rows_to_objects(self, rows):
+        return rows
+
+
+class TimelinePaginator(KeysetPaginator):
+    """Паджинатор ленты подписок по записям FeedEntry."""
+
+    def rows_to_objects(self, rows):
+        return [entry.post for entry in rows]
+
+
+def elided_page_range(page, on_each_side=PAGES_ON_EACH_SIDE,
+                      on_ends=PAGES_ON_ENDS):
+    """Номера страниц вокруг текущей, края ленты и ELLIPSIS между ними."""
+    number, num_pages = page.number, page.paginator.num_pages
+    if num_pages <= (on_each_side + on_ends) * 2 + 1:
+        yield from range(1, num_pages + 1)
+        return
+    window_start = max(number - on_each_side, 1)
+    window_end = min(number + on_each_side, num_pages)
+    if window_start > on_ends + 2:
+        yield from range(1, on_ends + 1)
+        yield ELLIPSIS
+    else:
+        window_start = 1
+    if window_end < num_pages - on_ends - 1:
+        yield from range(window_start, window_end + 1)
+        yield ELLIPSIS
+        yield from range(num_pages - on_ends + 1, num_pages + 1)
+    else:
+        yield from range(window_start, num_pages + 1)
 
 
-def paginator(request, post_list):
-    paginator = Paginator(post_list, COUNT_POST)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+def paginator(request, post_list, paginator_class=KeysetPaginator,
+              known_count=None):
+    paginator = paginator_class(
+        post_list, COUNT_POST, known_count=known_count
+    )
+    page = paginator.get_page(
+        request.GET.get('page'), cursor=request.GET.get('cursor')
+    )
+    page.page_range_window = []
+    if not isinstance(page, CursorPage):
+        page.page_range_window = list(elided_page_range(page))
+    return page
@@ -1,58 +1,133 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.urls import reverse
 
+from .autocomplete import GROUP, suggest
+from .cache import (INDEX, cache_feed, conditional_page, follow_feed_scopes,
+                    post_page_scopes, versions)
+from .counters import followed_posts_count, user_stats
 from .forms import CommentForm, PostForm
 from .models import Comment, Follow, Group, Post, User
+from .search import search_posts
+from .threads import discussion, replies, reply_target
+from .timeline import follow_feed
 from .utils import paginator
 
 
-@cache_page(20, key_prefix='index_page')
+@cache_feed(settings.FEED_CACHE_TIMEOUT, INDEX)
 def index(request):
-    post_list = Post.objects.all()
+    post_list = Post.objects.select_related('author', 'group')
     context = {
         'page_obj': paginator(request, post_list),
+        'feed_version': versions(INDEX),
     }
     return render(request, 'posts/index.html', context)
 
 
+@conditional_page('group:{slug}')
+@cache_feed(settings.FEED_CACHE_TIMEOUT, 'group:{slug}')
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
+    post_list = group.posts.select_related('author')
     context = {
         'group': group,
-        'page_obj': paginator(request, post_list),
+        'page_obj': paginator(
+            request, post_list, known_count=group.posts_count
+        ),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional_page('author:{username}')
+@cache_feed(settings.FEED_CACHE_TIMEOUT, 'author:{username}')
 def profile(request, username):
-    profile_user = get_object_or_404(User, username=username)
-    post_list = profile_user.posts.all()
-    following = request.user.is_authenticated and Follow.objects.filter(
-        user=request.user, author=profile_user
-    ).exists()
+    profile_user = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    post_list = profile_user.posts.select_related('group')
     context = {
         'profile_user': profile_user,
-        'page_obj': paginator(request, post_list),
-        'following': following
+        'page_obj': paginator(
+            request, post_list,
+            known_count=user_stats(profile_user).posts_count
+        ),
     }
     return render(request, 'posts/profile.html', context)
 
 
+def search(request):
+    query = request.GET.get('q', '')
+    posts, next_cursor = search_posts(query, request.GET.get('cursor'))
+    context = {
+        'query': query,
+        'posts': posts,
+        'next_cursor': next_cursor,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+def autocomplete(request):
+    results = []
+    for (kind, _), key, label in suggest(request.GET.get('q', '')):
+        if kind == GROUP:
+            url = reverse('posts:group_list', kwargs={'slug': key})
+        else:
+            url = reverse('posts:profile', kwargs={'username': key})
+        results.append(
+            {'type': kind, 'key': key, 'label': label, 'url': url}
+        )
+    return JsonResponse({'results': results})
+
+
+@conditional_page(post_page_scopes)
 def post_detail(request, post_id):
-    one_post = get_object_or_404(Post, id=post_id)
+    one_post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), id=post_id
+    )
+    user_stats(one_post.author)
     form = CommentForm()
-    comments = one_post.comments.all()
+    comments, comments_cursor = discussion(
+        one_post, request.GET.get('cursor')
+    )
     context = {
         'form': form,
         'comments': comments,
+        'comments_cursor': comments_cursor,
         'one_post': one_post,
+        'reply_to': reply_target(one_post, request.GET.get('reply_to')),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@cache_feed(settings.FEED_CACHE_TIMEOUT, 'post:{post_id}')
+def post_comments(request, post_id):
+    """Следующая порция комментариев поста — фрагмент страницы."""
+    post = get_object_or_404(Post.objects.only('id'), id=post_id)
+    comments, comments_cursor = discussion(post, request.GET.get('cursor'))
+    context = {
+        'comments': comments,
+        'comments_cursor': comments_cursor,
+        'one_post': post,
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+@cache_feed(settings.FEED_CACHE_TIMEOUT, 'post:{post_id}')
+def comment_replies(request, post_id, comment_id):
+    """Следующая порция ответов на комментарий — фрагмент страницы."""
+    comment = get_object_or_404(
+        Comment.objects.only('post', 'path', 'depth', 'replies_count'),
+        id=comment_id, post_id=post_id
+    )
+    context = {'parent': replies(comment, request.GET.get('after', ''))}
+    return render(request, 'posts/includes/reply_list.html', context)
+
+
 @login_required
+@transaction.atomic
 def post_create(request):
     form = PostForm(
         request.POST or None,
@@ -87,27 +162,40 @@ def post_edit(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
-    if form.is_valid():
+    parent_id = request.POST.get('parent')
+    parent = reply_target(post, parent_id)
+    if form.is_valid() and (parent or not parent_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
+        comment.parent = parent
         comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
+@cache_feed(
+    settings.FEED_CACHE_TIMEOUT,
+    lambda request: follow_feed_scopes(request.user),
+    shared=False
+)
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
+    post_list, paginator_class = follow_feed(request.user)
     context = {
-        'page_obj': paginator(request, post_list)
+        'page_obj': paginator(
+            request, post_list, paginator_class,
+            known_count=lambda: followed_posts_count(request.user)
+        )
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if request.user != author:
@@ -116,6 +204,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     following = Follow.objects.filter(user=request.user, author=author)
@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -55,6 +56,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.routers.ReplicaPinMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -74,6 +76,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
+                'core.context_processors.feed_cache.feed_cache_timeout',
             ],
         },
     },
@@ -85,13 +88,37 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# core.backends.sqlite3 включает WAL и начинает транзакции с
+# BEGIN IMMEDIATE. Сравнение со стандартным режимом:
+# python manage.py db_benchmark
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60,
+        'OPTIONS': {
+            # Сколько секунд писатель ждёт блокировку базы.
+            'timeout': 20,
+        },
     }
 }
 
+# Базы, с которых читают представления (core.routers). Для локальной
+# проверки — копия основной базы, которую обновляет
+# python manage.py sync_replica.
+DATABASE_REPLICAS = []
+if os.environ.get('YATUBE_REPLICA'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.path.join(BASE_DIR, 'db.replica.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS = ['replica']
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+# Сколько секунд после записи реплика может отставать: столько
+# пользователь и изменённые ленты читают основную базу.
+REPLICA_LAG = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -150,3 +177,62 @@ CACHES = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+
+# Закэшированные ленты сбрасываются сменой версии при изменении данных
+# (posts.cache), поэтому их можно хранить долго.
+FEED_CACHE_TIMEOUT = 60 * 60
+# Сколько секунд после истечения отдаётся устаревшая копия, пока один
+# запрос строит страницу заново.
+FEED_CACHE_GRACE = 60
+
+# Кэш в разделяемой памяти, общий для всех воркеров на хосте.
+# Сравнение с LocMemCache: python manage.py cache_benchmark
+if os.environ.get('YATUBE_SHARED_CACHE'):
+    CACHES['default'] = {
+        'BACKEND': 'core.cache.SharedMemoryCache',
+        'LOCATION': os.environ.get(
+            'YATUBE_SHARED_CACHE_LOCATION', '/dev/shm/yatube_cache.sqlite3'
+        ),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+
+# Подписчиков больше этого числа — посты автора не раскладываются по лентам
+# подписок при записи, а подмешиваются при чтении.
+TIMELINE_FANOUT_LIMIT = 1000
+# Обратно к раскладке при записи автор возвращается (python manage.py
+# push_feeds), когда подписчиков становится меньше LIMIT - MARGIN.
+TIMELINE_FANOUT_MARGIN = 100
+
+# Размеры миниатюр постов. Их строит python manage.py thumbnail_worker,
+# шаблоны только ищут готовую миниатюру (posts.thumbnails).
+POST_THUMBNAILS = {
+    '480x170': {'crop': 'center', 'upscale': True},
+    '960x339': {'crop': 'center', 'upscale': True},
+    '1920x678': {'crop': 'center', 'upscale': True},
+}
+# Миниатюры, из которых собирается srcset для основного размера.
+POST_IMAGE_SRCSET = {
+    '960x339': ('480x170', '960x339', '1920x678'),
+}
+THUMBNAIL_WORKERS = 2
+# Через сколько секунд после изменения поста недостающая миниатюра
+# строится прямо при отрисовке страницы.
+THUMBNAIL_WORKER_LAG = 5 * 60
+
+# Загруженные изображения уменьшаются до этого размера и пересохраняются
+# без метаданных (posts.images).
+POST_IMAGE_MAX_SIZE = (1920, 1920)
+POST_IMAGE_QUALITY = 82
+# Pillow держит в памяти все кадры анимации, поэтому GIF, у которого
+# кадров или пикселей во всех кадрах больше этого, не принимается.
+POST_GIF_MAX_FRAMES = 300
+POST_GIF_MAX_PIXELS = 64 * 1024 * 1024
+
+# Класс поиска по постам; None — FTS5 в SQLite, icontains в других базах.
+POST_SEARCH_BACKEND = None
+
+# Выборки до этого числа строк паджинаторы считают точно, большие —
+# по статистике планировщика или счётчикам (core.counts).
+EXACT_COUNT_THRESHOLD = 1000